@@ -2,6 +2,7 @@ import os
 import cv2  # 用OpenCV库
 import pandas as pd
 import numpy as np
+from rgb_extract import corner_white_average, channel_histograms, corrected_mean
 
 
 image_dir = '../newData/standard/blue'
@@ -21,31 +22,17 @@ def extract_rgb(image_path):
     image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     h, w, _ = image.shape
 
-    # 计算统一的区域大小，避免不同角落区域大小不一致的问题
-    corner_h = h // 8
-    corner_w = w // 8
-
     # 1. 提取白色区域的平均RGB值（取四周的小角落区域，1/64，一共4块，相当于1/16）
-    white_roi = np.concatenate((
-        image[:corner_h, :corner_w],  # 左上角
-        image[:corner_h, -corner_w:],  # 右上角
-        image[-corner_h:, :corner_w],  # 左下角
-        image[-corner_h:, -corner_w:]  # 右下角
-    ), axis=0)  # 将四角区域合并
-
-    white_avg_rgb = cv2.mean(white_roi)[:3]  # 计算白色区域的平均RGB值
+    white_avg_rgb = corner_white_average(image)
 
     # 2. 计算校正因子（根据白色区域与理想白色的差异）
-    correction_factor = ideal_white / np.array(white_avg_rgb)
+    correction_factor = ideal_white / white_avg_rgb
 
     # 3. 提取图像中心区域的RGB值
     center_roi = image[h // 4:3 * h // 4, w // 4:3 * w // 4]  # 选择图像的中心区域来计算平均RGB值，去掉上下和左右各1/4的边界
 
-    # 4. 应用校正因子，矫正中心区域的RGB值
-    corrected_center_roi = center_roi * correction_factor  # 将校正因子应用到中心区域
-    corrected_center_roi = np.clip(corrected_center_roi, 0, 255)  # 确保RGB值在0到255之间
-
-    average_color = cv2.mean(corrected_center_roi)[:3]  # 计算矫正后中心区域的平均RGB值
+    # 4. 按直方图应用校正因子并求平均（不截断为整数），与逐像素矫正后取平均结果一致
+    average_color = corrected_mean(channel_histograms(center_roi), correction_factor, truncate=False)
 
     return average_color
 
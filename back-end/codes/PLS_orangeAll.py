@@ -1,49 +1,54 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.cross_decomposition import PLSRegression
 from sklearn.metrics import mean_squared_error, r2_score
 import joblib
-import glob
 import os
 
+from dataset_store import load
+from partition import partition
+from applicability import attach_applicability, robust_inliers
+from pls_importance import attach_importance
+
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 使用黑体
 plt.rcParams['axes.unicode_minus'] = False  # 解决保存图像时负号显示为方块的问题
 
-# 加载所有数据文件，排除临时文件（以~$开头的文件）
-file_paths = [f for f in glob.glob('../Data/ALL-Orange-Data/*.xlsx') if not os.path.basename(f).startswith('~$')]
-
-all_data = []
-
-for file_path in file_paths:
-    data = pd.read_excel(file_path)
-    all_data.append(data)
+# 从合并后的数据集读取 ../Data/ALL-Orange-Data 下的全部数据（源文件有变化时自动重新生成）
+data = load('all_orange', columns=['Absorbance', 'Concentration', 'Red', 'Green', 'Blue'])
 
-# 合并所有数据
-data = pd.concat(all_data, ignore_index=True)
+# 检查并移除离群点：默认对整张表做 z 分数过滤；
+# 设置环境变量 OUTLIER_FILTER=robust 时改用 PLS 的 T²、Q、杠杆值和 y 残差迭代剔除（见 applicability.robust_inliers）
+outlier_filter = os.environ.get('OUTLIER_FILTER', 'zscore')
+if outlier_filter == 'robust':
+    inliers = robust_inliers(data[['Red', 'Green', 'Blue']].values, data[['Absorbance', 'Concentration']].values, 3)
+    print("离群点索引:", np.flatnonzero(~inliers))
 
-# 检查并移除离群点
-z_scores = np.abs((data - data.mean()) / data.std())  # 计算Z分数
-threshold = 2.1
-outliers = np.where(z_scores > threshold)
+    # 移除离群点
+    cleaned_data = data[inliers]
+elif outlier_filter == 'zscore':
+    z_scores = np.abs((data - data.mean()) / data.std())  # 计算Z分数
+    threshold = 2.1
+    outliers = np.where(z_scores > threshold)
 
-print("离群点索引:", outliers)
+    print("离群点索引:", outliers)
 
-# 移除离群点
-cleaned_data = data[(z_scores < threshold).all(axis=1)]
+    # 移除离群点
+    cleaned_data = data[(z_scores < threshold).all(axis=1)]
+else:
+    raise ValueError(f'未知的离群点过滤方式: {outlier_filter}（可选 zscore、robust）')
 
 # 提取特征和目标变量
 X = cleaned_data[['Red', 'Green', 'Blue']].values
 y_absorbance = cleaned_data['Absorbance'].values
 y_concentration = cleaned_data['Concentration'].values
 
-# 划分数据集为训练集和验证集
-X_train, X_val, y_train_absorbance, y_val_absorbance, y_train_concentration, y_val_concentration = train_test_split(
-    X, y_absorbance, y_concentration, test_size=0.2, random_state=42
-)
+# 划分数据集为训练集和验证集：SPXY 同时按 RGB 和吸光度、浓度的距离选出覆盖整个范围的训练集
+train_index, val_index = partition(X, np.column_stack((y_absorbance, y_concentration)), test_size=0.2, method='spxy')
+X_train, X_val = X[train_index], X[val_index]
+y_train_absorbance, y_val_absorbance = y_absorbance[train_index], y_absorbance[val_index]
+y_train_concentration, y_val_concentration = y_concentration[train_index], y_concentration[val_index]
 
 # 数据标准化
 scaler_X = StandardScaler()
@@ -62,10 +67,14 @@ y_val_concentration_scaled = scaler_y_concentration.transform(y_val_concentratio
 n_components = 3  # 选择PLS成分的数量，3最优
 pls_absorbance = PLSRegression(n_components=n_components)
 pls_absorbance.fit(X_train_scaled, y_train_absorbance_scaled)
+attach_importance(pls_absorbance, X_train_scaled)
+attach_applicability(pls_absorbance, X_train_scaled)
 
 # 建立PLS回归模型用于浓度预测
 pls_concentration = PLSRegression(n_components=n_components)
 pls_concentration.fit(X_train_scaled, y_train_concentration_scaled)
+attach_importance(pls_concentration, X_train_scaled)
+attach_applicability(pls_concentration, X_train_scaled)
 
 # 训练集预测
 y_train_absorbance_pred_scaled = pls_absorbance.predict(X_train_scaled)
@@ -1,10 +1,19 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, g
 import numpy as np
-import cv2
-import joblib
+import io
+import multiprocessing
 import os
+import re
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
+from model_registry import ModelRegistry
+from result_cache import ResultCache, content_digest, content_key
+from blob_store import BlobStore
+from image_decode import decode_image, scale_box, ImageTooLarge, MAX_IMAGE_PIXELS
+from pipeline import extract_rgb, analyze_image
+from worker_pool import WorkerPool, PoolSaturated
+from overlay import LazyOverlayStore
+from metrics import Metrics, StageTimer
 
 app = Flask(__name__)
 CORS(app)
@@ -14,83 +23,156 @@ PROCESSED_FOLDER = 'processed'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['PROCESSED_FOLDER'] = PROCESSED_FOLDER
+# 是否把上传的原图另存一份到 uploads/，默认只在内存中处理
+app.config['SAVE_UPLOADS'] = os.environ.get('SAVE_UPLOADS', '0') == '1'
+# 大图按尺寸降采样解码；超过像素上限的图片在解码前拒绝
+app.config['REDUCED_DECODE'] = os.environ.get('REDUCED_DECODE', '1') == '1'
+app.config['MAX_IMAGE_PIXELS'] = int(os.environ.get('MAX_IMAGE_PIXELS', str(MAX_IMAGE_PIXELS)))
 
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-if not os.path.exists(PROCESSED_FOLDER):
-    os.makedirs(PROCESSED_FOLDER)
+# uploads/ 和 processed/ 按内容哈希分片存储，超过容量或过期后自动淘汰
+BLOB_MAX_BYTES = int(os.environ.get('BLOB_MAX_MB', '1024')) * 1024 * 1024
+BLOB_MAX_FILES = int(os.environ.get('BLOB_MAX_FILES', '10000'))
+BLOB_TTL = float(os.environ.get('BLOB_TTL_HOURS', '0')) * 3600 or None
+upload_store = BlobStore(UPLOAD_FOLDER, BLOB_MAX_BYTES, BLOB_MAX_FILES, BLOB_TTL)
+processed_store = BlobStore(PROCESSED_FOLDER, BLOB_MAX_BYTES, BLOB_MAX_FILES, BLOB_TTL)
+BLOB_COMPACT_INTERVAL = float(os.environ.get('BLOB_COMPACT_INTERVAL', '300'))
 
-# 加载训练好的PLS模型和标准化器
-blue_pls_absorbance_model = joblib.load('BluePurple-trained_pls_absorbance_model.pkl')
-blue_pls_concentration_model = joblib.load('BluePurple-trained_pls_concentration_model.pkl')
-blue_scaler_X = joblib.load('BluePurple-scaler_X_standard.pkl')
-blue_scaler_y_absorbance = joblib.load('BluePurple-scaler_y_absorbance_standard.pkl')
-blue_scaler_y_concentration = joblib.load('BluePurple-scaler_y_concentration_standard.pkl')
+# 模型注册表：默认从当前目录加载（与部署时把 .pkl 放在 app.py 旁边一致），
+# 也可以通过 MODEL_DIR 指向 back-end/model 这样按颜色和版本分目录的布局
+app.config['MODEL_DIR'] = os.environ.get('MODEL_DIR', '.')
+model_registry = ModelRegistry(app.config['MODEL_DIR'])
+
+# 上传结果缓存的条目上限，设为 0 关闭缓存
+result_cache = ResultCache(int(os.environ.get('RESULT_CACHE_SIZE', '1024')))
+
+# 待渲染的处理后图像（原图字节 + 方框坐标）及渲染结果占用的内存上限
+overlay_store = LazyOverlayStore(int(os.environ.get('OVERLAY_CACHE_MB', '256')) * 1024 * 1024)
+
+# 定期检查模型目录，文件更新后自动切换；设为 0 则只能通过 /admin/reload_models 切换
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', '10'))
+
+# 多进程处理模式，默认不启用（在请求线程中直接处理），见 run.py
+worker_pool = None
+# 进程池满载时返回 503，并建议客户端等待的秒数
+RETRY_AFTER = os.environ.get('RETRY_AFTER', '2')
+
+# 各阶段耗时直方图和按颜色类型、错误类型的计数，通过 /metrics 导出
+metrics = Metrics()
+
+
+def start_background_tasks():
+    """启动 uploads/、processed/ 的定期清理和模型目录监视，只应在服务进程中调用一次
+
+    工作进程（spawn）不会调用：它们不应各自按启动时的旧索引清理共享目录，模型由主进程通知切换。
+    """
+    if BLOB_COMPACT_INTERVAL > 0:
+        upload_store.start_compaction(BLOB_COMPACT_INTERVAL)
+        processed_store.start_compaction(BLOB_COMPACT_INTERVAL)
+    if MODEL_WATCH_INTERVAL > 0:
+        model_registry.start_watching(MODEL_WATCH_INTERVAL)
+
+
+# 被子进程导入时（例如 spawn 的工作进程重新执行入口脚本）不启动后台线程
+if multiprocessing.parent_process() is None:
+    start_background_tasks()
 
-orange_pls_absorbance_model = joblib.load('OrangePurple-trained_pls_absorbance_model.pkl')
-orange_pls_concentration_model = joblib.load('OrangePurple-trained_pls_concentration_model.pkl')
-orange_scaler_X = joblib.load('OrangePurple-scaler_X_standard.pkl')
-orange_scaler_y_absorbance = joblib.load('OrangePurple-scaler_y_absorbance_standard.pkl')
-orange_scaler_y_concentration = joblib.load('OrangePurple-scaler_y_concentration_standard.pkl')
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_rgb(image_path):
-    img = cv2.imread(image_path)
-    height, width, _ = img.shape
-
-    # 提取四个角的白色区域，每个区域大小为 h//8 和 w//8
-    corner_h = height // 8
-    corner_w = width // 8
-
-    # 获取四个角区域
-    top_left = img[:corner_h, :corner_w]
-    top_right = img[:corner_h, -corner_w:]
-    bottom_left = img[-corner_h:, :corner_w]
-    bottom_right = img[-corner_h:, -corner_w:]
-
-    # 合并四个角的区域，计算平均白色RGB
-    white_regions = np.concatenate((top_left, top_right, bottom_left, bottom_right), axis=0)
-    avg_color_per_row = np.average(white_regions, axis=0)
-    avg_white_colors = np.average(avg_color_per_row, axis=0)
-
-    # 计算白色校正因子，目标是将白色矫正到理想的白色RGB [255, 255, 255]
-    ideal_white = np.array([255, 255, 255])
-    correction_factor = ideal_white / avg_white_colors
-
-    # 提取中心区域的 RGB 值
-    center_x, center_y = width // 4, height // 4
-    center_width, center_height = width // 2, height // 2
-    center_img = img[center_y:center_y + center_height, center_x:center_x + center_width]
-
-    # 对中心区域应用白色校正因子
-    corrected_center_img = center_img * correction_factor
-    corrected_center_img = np.clip(corrected_center_img, 0, 255).astype(np.uint8)
-
-    # 计算校正后的中心区域的平均RGB
-    avg_color_per_row_center = np.average(corrected_center_img, axis=0)
-    avg_colors_center = np.average(avg_color_per_row_center, axis=0)
-
-    # 返回校正后的中心RGB值和中心区域的坐标
-    return {'red': avg_colors_center[2], 'green': avg_colors_center[1], 'blue': avg_colors_center[0]}, (center_x, center_y, center_width, center_height)
-
-
-def add_red_box(image_path, box_coords):
-    img = cv2.imread(image_path)
-    center_x, center_y, center_width, center_height = box_coords
-    cv2.rectangle(img, (center_x, center_y), (center_x + center_width, center_y + center_height), (0, 0, 255), 2)
-    processed_image_path = os.path.join(app.config['PROCESSED_FOLDER'], 'processed_' + os.path.basename(image_path))
-    cv2.imwrite(processed_image_path, img)
-    return processed_image_path
-
-def determine_color(rgb):
-    """简单判断颜色是甲基橙还是亚甲基蓝"""
-    red, green, blue = rgb['red'], rgb['green'], rgb['blue']
-    if red > blue:
-        return 'orange'
-    else:
-        return 'blue'
+def decode_upload(data):
+    """按配置解码上传的图片，返回 (图像, 缩小倍数)"""
+    return decode_image(data, reduce=app.config['REDUCED_DECODE'], max_pixels=app.config['MAX_IMAGE_PIXELS'])
+
+
+def enable_worker_pool(workers, queue_size):
+    """启用多进程处理模式（由 run.py 调用），每个工作进程各自加载模型"""
+    global worker_pool
+    worker_pool = WorkerPool(workers, queue_size, app.config['MODEL_DIR'])
+    print(f"Worker pool started: {workers} workers, queue {queue_size}")
+    return worker_pool
+
+
+def file_ext(filename):
+    return os.path.splitext(filename)[1].lower() or '.png'
+
+
+def save_upload(data, digest, filename):
+    """可选：按内容哈希把原图保存到 uploads/"""
+    if app.config['SAVE_UPLOADS']:
+        with g.timer.stage('file_write'):
+            file_path = upload_store.put(digest, data, file_ext(filename))
+        print("File saved to:", file_path)
+
+
+def error_label(error):
+    """把错误信息转换成指标标签，例如 'Image too large' -> 'image_too_large'"""
+    return re.sub(r'[^a-z0-9]+', '_', error.lower()).strip('_')
+
+
+def count_error(error):
+    metrics.inc('errors', 'error', error_label(error))
+
+
+def register_processed_image(data, digest, box_coords, filename):
+    """只记录画框所需的信息，真正的渲染推迟到客户端请求 /processed_image 时
+
+    处理后图像按原图内容哈希命名，不同用户上传同名文件不会冲突
+    """
+    processed_name = 'processed_' + digest[:32] + file_ext(filename)
+    overlay_store.register(processed_name, data, box_coords)
+    return os.path.join(app.config['PROCESSED_FOLDER'], processed_name)
+
+
+def predict_batch(X, models=None):
+    """按 Red>Blue 把整批 RGB 分成橙色和蓝色两组，每组只调用一次模型，再按原顺序放回"""
+    if models is None:
+        models = model_registry.current()
+    return models.predict_batch(X)
+
+
+def summarize_series(results):
+    """按颜色类型汇总一组降解照片（按上传顺序，第一张视为初始浓度）"""
+    summaries = {}
+    for color_type in ('orange', 'blue'):
+        series = [r for r in results if r.get('color_type') == color_type]
+        if not series:
+            continue
+        concentrations = np.array([r['concentration'] for r in series])
+        absorbances = np.array([r['absorbance'] for r in series])
+        initial, final = concentrations[0], concentrations[-1]
+        summaries[color_type] = {
+            'count': len(series),
+            'initial_concentration': float(initial),
+            'final_concentration': float(final),
+            'min_concentration': float(concentrations.min()),
+            'max_concentration': float(concentrations.max()),
+            'mean_absorbance': float(absorbances.mean()),
+            # 相对浓度 C/C0 和降解率 (C0-C)/C0
+            'relative_concentration': (concentrations / initial).tolist() if initial > 0 else None,
+            'degradation_rate': float((initial - final) / initial) if initial > 0 else None
+        }
+    return summaries
+
+
+@app.before_request
+def start_timer():
+    g.timer = StageTimer(metrics)
+
+
+@app.after_request
+def add_server_timing(response):
+    timer = g.get('timer')
+    if timer is not None and timer.timings:
+        response.headers['Server-Timing'] = timer.server_timing()
+    return response
+
+
+@app.teardown_request
+def count_exception(exc):
+    # 未处理的异常按异常类名计数
+    if exc is not None:
+        metrics.inc('errors', 'error', type(exc).__name__)
 
 
 @app.route('/')
@@ -106,6 +188,7 @@ def upload_file():
     print("Received request:", request.method)
     if 'file' not in request.files:
         print("No file part")
+        count_error('No file part')
         return jsonify({'error': 'No file part'})
 
     file = request.files['file']
@@ -113,73 +196,229 @@ def upload_file():
 
     if file.filename == '':
         print("No selected file")
+        count_error('No selected file')
         return jsonify({'error': 'No selected file'})
 
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        print("File saved to:", file_path)
-
-        # 提取RGB值并获取中心区域的坐标
-        rgb, box_coords = extract_rgb(file_path)
-        print("Extracted RGB:", rgb)
-
-        # 识别颜色类型
-        color_type = determine_color(rgb)
-        print("Detected color type:", color_type)
-
-        # 选择相应的模型
-        if color_type == 'blue':
-            pls_absorbance_model = blue_pls_absorbance_model
-            pls_concentration_model = blue_pls_concentration_model
-            scaler_X = blue_scaler_X
-            scaler_y_absorbance = blue_scaler_y_absorbance
-            scaler_y_concentration = blue_scaler_y_concentration
+        with g.timer.stage('receive'):
+            data = file.read()
+
+        # 相同内容 + 相同模型版本直接返回缓存结果；重试请求可带 Idempotency-Key 共享正在进行的计算。
+        # 结果按实际计算所用的模型版本缓存（工作进程切换模型的瞬间可能与主进程不同）
+        models = model_registry.current()
+        digest = content_digest(data)
+        key = content_key(digest, models.version)
+        idempotency_key = request.headers.get('Idempotency-Key')
+        try:
+            result = result_cache.get_or_compute(key, lambda: analyze_upload(data, digest, filename, models),
+                                                 idempotency_key)
+        except PoolSaturated:
+            print("Server busy")
+            count_error('Server busy')
+            return jsonify({'error': 'Server busy'}), 503, {'Retry-After': RETRY_AFTER}
+        if 'error' in result:
+            count_error(result['error'])
         else:
-            pls_absorbance_model = orange_pls_absorbance_model
-            pls_concentration_model = orange_pls_concentration_model
-            scaler_X = orange_scaler_X
-            scaler_y_absorbance = orange_scaler_y_absorbance
-            scaler_y_concentration = orange_scaler_y_concentration
-
-        # 添加红色方框并保存处理后的图像
-        processed_image_path = add_red_box(file_path, box_coords)
-        print("Processed image saved to:", processed_image_path)
-
-        # 标准化输入数据
-        X = np.array([[rgb['red'], rgb['green'], rgb['blue']]])
-        X_scaled = scaler_X.transform(X)
-
-        # 同时预测浓度和吸光度
-        # 预测吸光度
-        y_absorbance_scaled = pls_absorbance_model.predict(X_scaled)
-        absorbance = scaler_y_absorbance.inverse_transform(y_absorbance_scaled.reshape(-1, 1)).ravel()[0]
-        absorbance = max(0, absorbance)
-        print("Predicted absorbance:", absorbance)
-
-        # 预测浓度
-        y_concentration_scaled = pls_concentration_model.predict(X_scaled)
-        concentration = scaler_y_concentration.inverse_transform(y_concentration_scaled.reshape(-1, 1)).ravel()[0]
-        concentration = max(0, concentration)
-        print("Predicted concentration:", concentration)
-
-        # 返回所有数据
-        return jsonify({
-            'rgb': rgb,
-            'absorbance': absorbance,
-            'concentration': concentration,
-            'processed_image': processed_image_path
-        })
+            # 缓存命中时不会重新走 analyze_upload，处理后图像的原图可能已从内存中淘汰，重新记录一次
+            overlay_store.ensure(os.path.basename(result['processed_image']), data,
+                                 [r['box'] for r in result['regions']])
+            metrics.inc('uploads', 'color_type', result['color_type'])
+        return jsonify(result)
 
     else:
         print("File type not allowed")
+        count_error('File type not allowed')
         return jsonify({'error': 'File type not allowed'})
 
 
+def analyze_upload(data, digest, filename, models):
+    """完整处理一张上传的图片，返回 (响应内容, 缓存键)，不能缓存时缓存键为 None"""
+    # 可选：把原图保存到磁盘
+    save_upload(data, digest, filename)
+
+    # 解码、提取RGB和预测：多进程模式下在工作进程中执行，工作进程的模型与 models 版本不同时先重新加载
+    if worker_pool is not None:
+        outcome = worker_pool.analyze(data, app.config['REDUCED_DECODE'], app.config['MAX_IMAGE_PIXELS'],
+                                      models.version)
+    else:
+        outcome = analyze_image(data, models, app.config['REDUCED_DECODE'], app.config['MAX_IMAGE_PIXELS'])
+    # 各阶段耗时只记录到指标中，不放进响应和缓存
+    for stage, seconds in outcome.pop('timings', {}).items():
+        g.timer.record(stage, seconds)
+    models_version = outcome.pop('models_version', models.version)
+    if 'error' in outcome:
+        print("Analyze failed:", outcome['error'])
+        return outcome, None
+
+    rgb = outcome['rgb']
+    color_type = outcome['color_type']
+    print("Extracted RGB:", rgb)
+    print("Detected color type:", color_type)
+
+    # 记录每个样本区域红色方框的位置，处理后的图像在第一次被请求时才渲染
+    processed_image_path = register_processed_image(data, digest, [r['box'] for r in outcome['regions']], filename)
+    print("Processed image registered:", processed_image_path)
+
+    absorbance = outcome['absorbance']
+    print("Predicted absorbance:", absorbance)
+    concentration = outcome['concentration']
+    print("Predicted concentration:", concentration)
+
+    # 返回所有数据
+    return {
+        'rgb': rgb,
+        'absorbance': absorbance,
+        'concentration': concentration,
+        'processed_image': processed_image_path,
+        'color_type': color_type,
+        't2': outcome['t2'],
+        'q': outcome['q'],
+        'in_domain': outcome['in_domain'],
+        'model_version': outcome['model_version'],
+        # 照片中每个样本区域（孔板的各个孔）的结果，按行、列排序；detected 为 False 时是整张图的中心区域
+        'regions': outcome['regions'],
+        'detected': outcome['detected']
+    }, content_key(digest, models_version)
+
+
+@app.route('/upload_batch', methods=['POST'])
+def upload_batch():
+    """一次上传一组照片（表单字段 files），整批提取特征后每个模型只预测一次"""
+    files = request.files.getlist('files')
+    print("Received batch:", len(files))
+    if not files:
+        print("No file part")
+        return jsonify({'error': 'No file part'})
+
+    results = []
+    rows = []
+    row_indices = []
+    for file in files:
+        if file.filename == '' or not allowed_file(file.filename):
+            results.append({'filename': file.filename, 'error': 'File type not allowed'})
+            continue
+
+        filename = secure_filename(file.filename)
+        with g.timer.stage('receive'):
+            data = file.read()
+        digest = content_digest(data)
+        save_upload(data, digest, filename)
+
+        try:
+            with g.timer.stage('decode'):
+                img, factor = decode_upload(data)
+        except ImageTooLarge:
+            count_error('Image too large')
+            results.append({'filename': file.filename, 'error': 'Image too large'})
+            continue
+        if img is None:
+            count_error('Invalid image')
+            results.append({'filename': file.filename, 'error': 'Invalid image'})
+            continue
+
+        with g.timer.stage('white_balance'):
+            rgb, box_coords = extract_rgb(img)
+        box_coords = scale_box(box_coords, factor)
+        processed_image_path = register_processed_image(data, digest, box_coords, filename)
+
+        results.append({'filename': file.filename, 'rgb': rgb, 'processed_image': processed_image_path})
+        rows.append([rgb['red'], rgb['green'], rgb['blue']])
+        row_indices.append(len(results) - 1)
+
+    # 整批预测，每种颜色的模型只调用一次
+    models = model_registry.current()
+    if rows:
+        with g.timer.stage('predict'):
+            color_types, absorbances, concentrations = predict_batch(rows, models)
+            t2s, qs, in_domains = models.check_domain_batch(rows)
+        for i, color_type, absorbance, concentration, t2, q, in_domain in zip(
+                row_indices, color_types, absorbances, concentrations, t2s, qs, in_domains):
+            metrics.inc('uploads', 'color_type', str(color_type))
+            results[i]['color_type'] = str(color_type)
+            results[i]['absorbance'] = float(absorbance)
+            results[i]['concentration'] = float(concentration)
+            results[i]['t2'] = None if np.isnan(t2) else float(t2)
+            results[i]['q'] = None if np.isnan(q) else float(q)
+            results[i]['in_domain'] = None if in_domain is None else bool(in_domain)
+            results[i]['model_version'] = models.versions[str(color_type)]
+
+    return jsonify({
+        'results': results,
+        'summary': summarize_series(results),
+        'model_version': models.version
+    })
+
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    stats = result_cache.stats()
+    stats['uploads'] = upload_store.stats()
+    stats['processed'] = processed_store.stats()
+    return jsonify(stats)
+
+
+@app.route('/pool_stats', methods=['GET'])
+def pool_stats():
+    if worker_pool is None:
+        return jsonify({'workers': 0})
+    return jsonify(worker_pool.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    """Prometheus 文本格式的指标，附带结果缓存、文件存储和进程池的状态"""
+    gauges = {'result_cache_' + name: value for name, value in result_cache.stats().items()}
+    for prefix, store in (('upload_store_', upload_store), ('processed_store_', processed_store)):
+        gauges.update({prefix + name: value for name, value in store.stats().items()})
+    if worker_pool is not None:
+        gauges.update({'worker_pool_' + name: value for name, value in worker_pool.stats().items()})
+    return metrics.render(gauges), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+@app.route('/admin/reload_models', methods=['POST'])
+def reload_models():
+    """重新加载模型目录，需要在 X-Admin-Token 头中提供 ADMIN_TOKEN；没有设置 ADMIN_TOKEN 时接口不可用
+
+    不按来源地址放行：部署在 nginx 之后时所有请求的 remote_addr 都是 127.0.0.1。
+    """
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token or request.headers.get('X-Admin-Token') != admin_token:
+        return jsonify({'error': 'Forbidden'}), 403
+
+    try:
+        models = model_registry.reload()
+    except Exception as e:
+        print("Model reload failed:", repr(e))
+        return jsonify({'error': 'Model reload failed', 'detail': str(e)}), 500
+    return jsonify({'model_version': models.version, 'versions': models.versions})
+
+
 @app.route('/processed_image/<filename>', methods=['GET'])
 def get_processed_image(filename):
-    return send_file(os.path.join(app.config['PROCESSED_FOLDER'], filename))
+    filename = secure_filename(filename)
+    key, ext = os.path.splitext(filename)
+    if key.startswith('processed_'):
+        key = key[len('processed_'):]
+
+    # 第一次请求时渲染，结果缓存在内存中并写入 processed/，之后直接返回
+    with g.timer.stage('render'):
+        rendered = overlay_store.render(filename)
+    if rendered is not None:
+        data, mimetype = rendered
+        with g.timer.stage('file_write'):
+            processed_store.put(key, data, ext)
+        return send_file(io.BytesIO(data), mimetype=mimetype)
+
+    # 内存中已淘汰的，从 processed/ 中读取
+    path = processed_store.get(key, ext)
+    if path is None:
+        # 兼容旧版本直接保存在 processed/ 下的文件
+        path = os.path.join(app.config['PROCESSED_FOLDER'], filename)
+    if not os.path.isfile(path):
+        count_error('Processed image not found')
+        return jsonify({'error': 'Processed image not found'}), 404
+    return send_file(path)
 
 
 if __name__ == '__main__':
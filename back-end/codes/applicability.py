@@ -0,0 +1,202 @@
+"""PLS 模型的适用域检查：Hotelling T² 和 Q 残差（SPE）
+
+训练时由 PLS 模型的得分、旋转矩阵和载荷算出控制限，作为 applicability_ 属性（只含数组的字典）
+随模型一起保存；预测时每个样本只需要一次标准化、一次 p×A 的矩阵乘法：
+    T² = t' S⁻¹ t，t = x_s · R（S 为训练集得分的协方差）
+    Q  = ||x_s − t · P'||²
+T² 超过 F 分布给出的控制限，说明样本在模型平面内离训练数据太远；Q 超过 Jackson–Mudholkar 控制限，
+说明样本不在模型平面上（颜色组合没见过）。两者都不超限才认为在适用域内。
+成分数等于变量数时（3 个成分的 RGB 模型）X 被完全重构，Q 恒为 0，只有 T² 起作用。
+
+robust_inliers 按 T²/Q、杠杆值和 y 的学生化残差迭代剔除离群样本；训练脚本默认仍对整张表做 z 分数过滤，
+设置环境变量 OUTLIER_FILTER=robust 时改用它。
+没有保存 applicability_ 的旧模型由 domain_from_scores 按拟合时保存的 x_scores_ 重建 T² 部分。
+"""
+import numpy as np
+from scipy import stats
+from sklearn.cross_decomposition import PLSRegression
+
+# 控制限的显著性水平（99% 控制限）
+ALPHA = 0.01
+
+
+def _t2_limit(n, a, alpha):
+    """新样本的 T² 控制限：A(n−1)(n+1) / (n(n−A)) · F(1−α; A, n−A)"""
+    if n <= a:
+        return np.inf
+    return a * (n - 1) * (n + 1) / (n * (n - a)) * stats.f.ppf(1 - alpha, a, n - a)
+
+
+def _t2_limit_training(n, a, alpha):
+    """参与拟合的训练样本自身的 T² 控制限：(n−1)² / n · Beta(1−α; A/2, (n−A−1)/2)"""
+    if n <= a + 1:
+        return np.inf
+    return (n - 1) ** 2 / n * stats.beta.ppf(1 - alpha, a / 2, (n - a - 1) / 2)
+
+
+def _q_limit(residuals, alpha):
+    """Jackson–Mudholkar 控制限，残差协方差的特征值为 0（X 已被完全重构）时不设限"""
+    n = len(residuals)
+    eigenvalues = np.linalg.eigvalsh(residuals.T @ residuals / max(n - 1, 1))
+    eigenvalues = eigenvalues[eigenvalues > 0]
+    theta1, theta2, theta3 = (np.sum(eigenvalues ** k) for k in (1, 2, 3))
+    # 与训练集 X 的总方差相比可以忽略时视为没有残差
+    if n < 2 or theta1 <= 1e-12 * max(1.0, np.einsum('ij,ij->', residuals, residuals)):
+        return np.inf
+    h0 = 1 - 2 * theta1 * theta3 / (3 * theta2 ** 2)
+    z = stats.norm.ppf(1 - alpha)
+    return theta1 * (z * np.sqrt(2 * theta2 * h0 ** 2) / theta1 + 1 + theta2 * h0 * (h0 - 1) / theta1 ** 2) ** (1 / h0)
+
+
+def fit_domain(pls, X, alpha=ALPHA):
+    """由拟合好的 sklearn PLSRegression 和它的训练数据 X 计算适用域，返回只含数组的字典"""
+    X = np.asarray(X, dtype=np.float64)
+    mean = np.asarray(pls._x_mean, dtype=np.float64)
+    scale = np.asarray(pls._x_std, dtype=np.float64)
+    rotations = np.asarray(pls.x_rotations_, dtype=np.float64)
+    loadings = np.asarray(pls.x_loadings_, dtype=np.float64)
+    Xs = (X - mean) / scale
+    scores = Xs @ rotations
+    n, a = scores.shape
+    score_inv_cov = np.linalg.pinv(np.atleast_2d(np.cov(scores, rowvar=False)))
+    return {
+        'mean': mean,
+        'scale': scale,
+        'rotations': rotations,
+        'loadings': loadings,
+        'score_inv_cov': score_inv_cov,
+        't2_limit': float(_t2_limit(n, a, alpha)),
+        'q_limit': float(_q_limit(Xs - scores @ loadings.T, alpha)),
+        'n_samples': n,
+        'alpha': alpha,
+    }
+
+
+def domain_from_scores(pls, alpha=ALPHA):
+    """旧模型（训练时没有保存 applicability_）的适用域：由 sklearn 保存的训练集得分 x_scores_ 重建
+
+    得分与 fit_domain 中的 x_s · R 相同，T² 和控制限完全一致；训练集的 X 残差没有保存，
+    成分数小于变量数时不设 Q 控制限（成分数等于变量数时 Q 本来就恒为 0）。没有 x_scores_ 时返回 None。
+    """
+    scores = getattr(pls, 'x_scores_', None)
+    if scores is None:
+        return None
+    scores = np.asarray(scores, dtype=np.float64)
+    n, a = scores.shape
+    return {
+        'mean': np.asarray(pls._x_mean, dtype=np.float64),
+        'scale': np.asarray(pls._x_std, dtype=np.float64),
+        'rotations': np.asarray(pls.x_rotations_, dtype=np.float64),
+        'loadings': np.asarray(pls.x_loadings_, dtype=np.float64),
+        'score_inv_cov': np.linalg.pinv(np.atleast_2d(np.cov(scores, rowvar=False))),
+        't2_limit': float(_t2_limit(n, a, alpha)),
+        'q_limit': float(np.inf),
+        'n_samples': n,
+        'alpha': alpha,
+    }
+
+
+def attach_applicability(pls, X, alpha=ALPHA):
+    """把适用域保存为 pls.applicability_，随 joblib.dump 一起保存，返回 pls"""
+    pls.applicability_ = fit_domain(pls, X, alpha)
+    return pls
+
+
+def compose_scaler(domain, scaler):
+    """把 StandardScaler 合并进适用域，使其直接作用在原始 RGB 上"""
+    offset = np.asarray(scaler.mean_, dtype=np.float64) if scaler.with_mean else 0.0
+    factor = np.asarray(scaler.scale_, dtype=np.float64) if scaler.with_std else 1.0
+    composed = dict(domain)
+    composed['mean'] = offset + factor * domain['mean']
+    composed['scale'] = factor * domain['scale']
+    return composed
+
+
+def statistics(domain, X):
+    """每个样本的 (T², Q)，X 为 (n, p)"""
+    Xs = (np.asarray(X, dtype=np.float64) - domain['mean']) / domain['scale']
+    scores = Xs @ domain['rotations']
+    residuals = Xs - scores @ domain['loadings'].T
+    t2 = np.einsum('na,ab,nb->n', scores, domain['score_inv_cov'], scores)
+    q = np.einsum('np,np->n', residuals, residuals)
+    return t2, q
+
+
+def check(domain, X):
+    """返回 (T², Q, 是否在适用域内) 三个长度为 n 的数组"""
+    t2, q = statistics(domain, X)
+    return t2, q, (t2 <= domain['t2_limit']) & (q <= domain['q_limit'])
+
+
+def robust_inliers(X, Y, n_components, alpha=ALPHA, max_iter=10):
+    """迭代剔除 X 空间或 y 残差异常的样本，返回布尔掩码（True 为保留）
+
+    每轮只用当前保留的样本拟合 PLS，满足任一条件即判为离群：
+    - T² 超限：保留的样本用训练样本的控制限（Beta 分布），已剔除的样本按新样本（F 分布）检查；
+    - Q 超限（成分数小于变量数时才起作用）；
+    - 杠杆值 h = 1/n + T²/(n−1) 超过 3(A+1)/n；
+    - y 的学生化残差超过 t(1−α/2; n−A−1)，多个目标时任一列超限即剔除。
+    掩码不再变化时停止；离群样本不参与拟合，不会像 z 分数那样撑大均值和标准差把自己“藏”起来。
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64).reshape(len(X), -1)
+    keep = np.ones(len(X), dtype=bool)
+    for _ in range(max_iter):
+        n = int(keep.sum())
+        dof = n - n_components - 1
+        if dof < 1:
+            break
+        pls = PLSRegression(n_components=n_components).fit(X[keep], Y[keep])
+        domain = fit_domain(pls, X[keep], alpha)
+        t2, q = statistics(domain, X)
+        leverage = 1 / n + t2 / (n - 1)
+
+        # 参与拟合的样本残差方差为 s²(1−h)，其余样本相当于新样本，方差为 s²(1+h)
+        residuals = Y - pls.predict(X).reshape(Y.shape)
+        s = np.sqrt(np.sum(residuals[keep] ** 2, axis=0) / dof)
+        spread = np.sqrt(np.where(keep, np.clip(1 - leverage, 1e-12, None), 1 + leverage))[:, None] * s
+        studentized = np.abs(residuals) / np.where(spread > 0, spread, np.inf)
+
+        t2_limit = np.where(keep, _t2_limit_training(n, n_components, alpha), domain['t2_limit'])
+        inside = ((t2 <= t2_limit) & (q <= domain['q_limit'])
+                  & (leverage <= 3 * (n_components + 1) / n)
+                  & (studentized <= stats.t.ppf(1 - alpha / 2, dof)).all(axis=1))
+        if np.array_equal(inside, keep) or inside.sum() <= n_components + 1:
+            break
+        keep = inside
+    return keep
+
+
+if __name__ == '__main__':
+    # 与训练脚本的 z 分数过滤对照剔除的样本，看几种明显不相关的颜色的统计量，以及单个样本的检查耗时
+    import time
+
+    from sklearn.preprocessing import StandardScaler
+
+    from dataset_store import load
+
+    for color in ('blue', 'orange'):
+        data = load(f'all_{color}', columns=['Red', 'Green', 'Blue', 'Absorbance', 'Concentration'])
+        X = data[['Red', 'Green', 'Blue']].values
+        Y = data[['Absorbance', 'Concentration']].values
+        keep = robust_inliers(X, Y, 3)
+        z_scores = np.abs((data - data.mean()) / data.std())
+        z_keep = (z_scores < 2.1).all(axis=1).values
+        print(f'{color}: z 分数剔除 {np.sum(~z_keep)} 个，robust_inliers 剔除 {np.sum(~keep)} 个，'
+              f'两者都剔除 {np.sum(~z_keep & ~keep)} 个')
+        scaler = StandardScaler().fit(X[keep])
+        pls = attach_applicability(PLSRegression(n_components=3).fit(scaler.transform(X[keep]), Y[keep, 0]),
+                                   scaler.transform(X[keep]))
+        domain = compose_scaler(pls.applicability_, scaler)
+        t2, q, inside = check(domain, X)
+        print(f'{color}: 剔除 {np.sum(~keep)}/{len(X)} 个样本，T² 控制限 {domain["t2_limit"]:.2f}，'
+              f'全部样本中 {inside.mean():.1%} 在适用域内')
+        probes = np.array([[200.0, 200.0, 200.0], [30.0, 30.0, 30.0], [250.0, 20.0, 20.0], [20.0, 250.0, 20.0]])
+        for rgb, value, ok in zip(probes, *check(domain, probes)[::2]):
+            print(f'  RGB {rgb.astype(int).tolist()}: T² {value:.1f}，{"在" if ok else "不在"}适用域内')
+
+        repeats = 20000
+        start = time.perf_counter()
+        for _ in range(repeats):
+            check(domain, X[:1])
+        print(f'  单个样本检查耗时 {(time.perf_counter() - start) / repeats * 1e6:.1f} 微秒')
@@ -0,0 +1,271 @@
+"""/upload 流水线的本地压测和分阶段耗时基准
+
+在本机启动真实的 Flask 应用（waitress），按指定并发回放 Data/ 下的照片，
+统计 p50/p95/p99 延迟、吞吐量和各进程的内存占用；再单独测量流水线每个阶段的耗时。
+结果保存为 JSON，用 --compare 可以和另一次（例如上一个提交）的结果对比。
+
+    python benchmark.py --model-dir ../model --concurrency 1 4 8 --requests 200
+    python benchmark.py --model-dir ../model --workers 4 --output after.json --compare before.json
+"""
+import argparse
+import glob
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=np.float64) * 1000
+    if values.size == 0:
+        return {}
+    return {
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max())
+    }
+
+
+def rss_mb(pid):
+    """读取进程的常驻内存（MB），非 Linux 系统返回 None"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def multipart_body(filename, data):
+    boundary = uuid.uuid4().hex
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode()
+    return head + data + f'\r\n--{boundary}--\r\n'.encode(), f'multipart/form-data; boundary={boundary}'
+
+
+def start_server(threads):
+    """在后台线程中用 waitress 启动应用，返回 (app 模块, server, 端口)"""
+    from waitress import create_server
+    import app as app_module
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    server = create_server(app_module.app, host='127.0.0.1', port=port, threads=threads)
+    threading.Thread(target=server.run, daemon=True).start()
+    return app_module, server, port
+
+
+def run_load(port, images, concurrency, n_requests):
+    """按并发数回放图片，返回延迟列表、状态码计数和总耗时"""
+    local = threading.local()
+
+    def send(i):
+        filename, data = images[i % len(images)]
+        body, content_type = multipart_body(filename, data)
+        if not hasattr(local, 'conn'):
+            local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        start = time.perf_counter()
+        try:
+            local.conn.request('POST', '/upload', body=body, headers={'Content-Type': content_type})
+            response = local.conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            status = 'error'
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        outcomes = list(executor.map(send, range(n_requests)))
+    wall = time.perf_counter() - start
+
+    latencies = [latency for latency, status in outcomes if status == 200]
+    statuses = {}
+    for _, status in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return latencies, statuses, wall
+
+
+def benchmark_stages(app_module, images, repeat):
+    """单独测量每个阶段（与 analyze_image 的阶段一致）：解码、区域检测、白平衡取色、判断颜色、预测、适用域检查、画框渲染"""
+    from image_decode import scale_box
+    from overlay import draw_red_boxes
+    from region_detect import detect_regions, extract_regions
+
+    models = app_module.model_registry.current()
+    timings = {'decode': [], 'detect': [], 'extract_regions': [], 'color': [], 'predict': [], 'domain': [],
+               'render': []}
+    for _ in range(repeat):
+        for filename, data in images:
+            start = time.perf_counter()
+            img, factor = app_module.decode_upload(data)
+            timings['decode'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            detection = detect_regions(img)
+            timings['detect'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            found, _ = extract_regions(img, detection=detection)
+            timings['extract_regions'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            X = np.array([[rgb['red'], rgb['green'], rgb['blue']] for rgb, _ in found])
+            color_types = models.classify(X)
+            timings['color'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            models.predict_batch(X, color_types)
+            timings['predict'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            models.check_domain_batch(X, color_types)
+            timings['domain'].append(time.perf_counter() - start)
+
+            # 对应原来的 add_red_box：全分辨率解码、画框、编码
+            start = time.perf_counter()
+            full = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            cv2.imencode(os.path.splitext(filename)[1] or '.png',
+                         draw_red_boxes(full, [scale_box(box, factor) for _, box in found]))
+            timings['render'].append(time.perf_counter() - start)
+    return {stage: percentiles(values) for stage, values in timings.items()}
+
+
+def compare(current, previous_path):
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f"\n与 {previous_path}（{previous.get('commit')}）对比:")
+    old_runs = {run['concurrency']: run for run in previous.get('load', [])}
+    for run in current['load']:
+        old = old_runs.get(run['concurrency'])
+        if not old or not old['latency'] or not run['latency']:
+            continue
+        print(f"  并发 {run['concurrency']:>3}: p50 {old['latency']['p50_ms']:.1f} -> {run['latency']['p50_ms']:.1f} ms, "
+              f"p95 {old['latency']['p95_ms']:.1f} -> {run['latency']['p95_ms']:.1f} ms, "
+              f"吞吐 {old['throughput_rps']:.1f} -> {run['throughput_rps']:.1f} req/s")
+    for stage, stats in current['stages'].items():
+        old = previous.get('stages', {}).get(stage)
+        if old and stats:
+            print(f"  {stage:>15}: {old['mean_ms']:.3f} -> {stats['mean_ms']:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default='../Data/**/*.png', help='回放的图片（glob）')
+    parser.add_argument('--model-dir', default=os.environ.get('MODEL_DIR', '.'))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--requests', type=int, default=200, help='每个并发级别发送的请求数')
+    parser.add_argument('--workers', type=int, default=0, help='工作进程数，0 表示线程模式')
+    parser.add_argument('--queue', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=None, help='waitress 线程数')
+    parser.add_argument('--cache', action='store_true', help='启用结果缓存（默认关闭，否则重复的图片只测到缓存命中）')
+    parser.add_argument('--stage-repeat', type=int, default=1, help='分阶段测量时每张图片重复的次数')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help='与之前保存的 JSON 结果对比')
+    args = parser.parse_args()
+
+    # 导入 app 之前设置好环境变量
+    os.environ['MODEL_DIR'] = args.model_dir
+    os.environ.setdefault('MODEL_WATCH_INTERVAL', '0')
+    os.environ.setdefault('BLOB_COMPACT_INTERVAL', '0')
+    if not args.cache:
+        os.environ['RESULT_CACHE_SIZE'] = '0'
+
+    paths = sorted(glob.glob(args.images, recursive=True))
+    if not paths:
+        sys.exit(f'没有找到图片: {args.images}')
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), f.read()))
+
+    threads = args.threads or max(max(args.concurrency), args.workers + args.queue) + 2
+    app_module, server, port = start_server(threads)
+    if args.workers > 0:
+        app_module.enable_worker_pool(args.workers, args.queue)
+    app_module.model_registry.current()
+
+    # 关掉每个请求的 print 输出，避免终端输出影响计时
+    devnull = open(os.devnull, 'w')
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'images': len(images),
+        'args': vars(args),
+        'load': []
+    }
+    try:
+        for concurrency in args.concurrency:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                # 预热一轮，让连接、模型和各种缓存就绪
+                run_load(port, images, concurrency, min(len(images), concurrency * 2))
+                latencies, statuses, wall = run_load(port, images, concurrency, args.requests)
+            finally:
+                sys.stdout = stdout
+
+            worker_rss = []
+            if app_module.worker_pool is not None:
+                worker_rss = [rss_mb(pid) for pid in app_module.worker_pool._executor._processes]
+            run = {
+                'concurrency': concurrency,
+                'requests': args.requests,
+                'statuses': statuses,
+                'wall_s': wall,
+                'throughput_rps': len(latencies) / wall if wall > 0 else 0.0,
+                'latency': percentiles(latencies),
+                'server_rss_mb': rss_mb(os.getpid()),
+                'worker_rss_mb': worker_rss
+            }
+            results['load'].append(run)
+            latency = run['latency']
+            print(f"并发 {concurrency:>3}: {run['throughput_rps']:.1f} req/s, "
+                  f"p50 {latency.get('p50_ms', 0):.1f} ms, p95 {latency.get('p95_ms', 0):.1f} ms, "
+                  f"p99 {latency.get('p99_ms', 0):.1f} ms, 状态 {statuses}, RSS {run['server_rss_mb']} MB"
+                  + (f", 工作进程 RSS {worker_rss} MB" if worker_rss else ''))
+
+        results['stages'] = benchmark_stages(app_module, images, args.stage_repeat)
+        for stage, stats in results['stages'].items():
+            print(f"{stage:>15}: 平均 {stats['mean_ms']:.3f} ms, p95 {stats['p95_ms']:.3f} ms")
+    finally:
+        server.close()
+        if app_module.worker_pool is not None:
+            app_module.worker_pool.shutdown()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
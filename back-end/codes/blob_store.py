@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+
+
+class BlobStore:
+    """按内容哈希寻址的文件存储，用来代替不断增长的 uploads/ 和 processed/ 目录
+
+    文件保存在 root/ab/cd/<哈希><扩展名>，按哈希前缀分两级子目录，单个目录的文件数保持很小。
+    同样的内容只存一份，不同用户上传同名文件也不会互相覆盖。
+    总字节数或文件数超过上限时按最近访问时间（LRU）淘汰，也可以设置过期时间（TTL），
+    后台线程定期执行淘汰并清理空目录。
+    """
+
+    def __init__(self, root, max_bytes=None, max_count=None, ttl=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_count = max_count
+        self.ttl = ttl
+        self._index = {}  # 相对路径 -> [大小, 最近访问时间]
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._compactor = None
+        self.evictions = 0
+
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """启动时扫描已有文件（包括旧版本直接放在根目录下的文件），建立索引"""
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                rel = os.path.relpath(path, self.root)
+                self._index[rel] = [stat.st_size, max(stat.st_atime, stat.st_mtime)]
+                self._bytes += stat.st_size
+
+    def _rel_path(self, key, ext=''):
+        return os.path.join(key[:2], key[2:4], key + ext)
+
+    def path_for(self, key, ext=''):
+        return os.path.join(self.root, self._rel_path(key, ext))
+
+    def put(self, key, data, ext=''):
+        """保存内容并返回路径；相同的键已存在时只更新访问时间"""
+        rel = self._rel_path(key, ext)
+        path = os.path.join(self.root, rel)
+        with self._lock:
+            entry = self._index.get(rel)
+            if entry is not None and os.path.exists(path):
+                entry[1] = time.time()
+                return path
+
+        # 先写临时文件再改名，读者不会看到写了一半的文件
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old = self._index.get(rel)
+            if old is not None:
+                self._bytes -= old[0]
+            self._index[rel] = [len(data), time.time()]
+            self._bytes += len(data)
+            over = self._over_limit()
+        if over:
+            self.compact()
+        return path
+
+    def get(self, key, ext=''):
+        """返回已保存文件的路径并记录访问，不存在时返回 None"""
+        rel = self._rel_path(key, ext)
+        with self._lock:
+            entry = self._index.get(rel)
+            if entry is None:
+                return None
+            entry[1] = time.time()
+        path = os.path.join(self.root, rel)
+        return path if os.path.exists(path) else None
+
+    def _over_limit(self):
+        return ((self.max_bytes is not None and self._bytes > self.max_bytes) or
+                (self.max_count is not None and len(self._index) > self.max_count))
+
+    def compact(self):
+        """淘汰过期和超出上限的文件，并删除空的分片目录，返回删除的文件数"""
+        now = time.time()
+        victims = []
+        with self._lock:
+            if self.ttl:
+                for rel, (size, last_access) in list(self._index.items()):
+                    if now - last_access > self.ttl:
+                        victims.append(rel)
+                        self._bytes -= size
+                        del self._index[rel]
+            if self._over_limit():
+                for rel in sorted(self._index, key=lambda r: self._index[r][1]):
+                    if not self._over_limit():
+                        break
+                    victims.append(rel)
+                    self._bytes -= self._index.pop(rel)[0]
+            self.evictions += len(victims)
+
+        dirs = set()
+        for rel in victims:
+            path = os.path.join(self.root, rel)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            dirs.add(os.path.dirname(path))
+
+        # 从深到浅删除空目录
+        for directory in sorted(dirs, key=len, reverse=True):
+            while os.path.abspath(directory) != os.path.abspath(self.root):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+        return len(victims)
+
+    def start_compaction(self, interval=300.0):
+        """启动后台线程定期整理"""
+        if self._compactor is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.compact()
+                except OSError as e:
+                    print("Blob store compaction failed:", repr(e))
+
+        self._compactor = threading.Thread(target=run, name='blob-compactor', daemon=True)
+        self._compactor.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._index),
+                'bytes': self._bytes,
+                'max_files': self.max_count,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions
+            }
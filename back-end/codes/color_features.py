@@ -0,0 +1,132 @@
+"""一次遍历中心区域得到扩展颜色特征：白平衡 RGB、光密度、HSV、CIELab、通道比值和分位数
+
+与 extract_rgb 一样先用四角白色算校正因子，对中心区域只统计一次每个通道的直方图：
+RGB 均值、光密度 −log10(I/I_white) 的均值和各分位数都由直方图和 256 级查找表精确得到，
+不产生逐像素的浮点图像。HSV 和 Lab 需要三个通道一起换算，只在缩小到 FEATURE_PIXELS 以内的中心区域上
+用查找表白平衡后交给 OpenCV 转换。
+
+    features, box = extract_color_features(cv2.imread('0.128.png'))   # {'Red': ..., 'OD_Red': ..., 'Hue': ...}
+"""
+import cv2
+import numpy as np
+
+from rgb_extract import (IDEAL_WHITE, center_box, channel_histograms, corner_white_average,
+                         corrected_mean, shrink, STRIP_PIXELS)
+
+# 计算 HSV 和 Lab 时中心区域缩小到的像素数上限
+FEATURE_PIXELS = 64 * 64
+PERCENTILES = (10, 50, 90)
+
+# 通道顺序为 RGB；直方图和校正因子按 OpenCV 的 BGR 顺序计算，输出时再换成 RGB
+CHANNELS = ('Red', 'Green', 'Blue')
+_BGR_INDEX = (2, 1, 0)
+
+FEATURE_NAMES = (
+    list(CHANNELS)
+    + [f'OD_{c}' for c in CHANNELS]
+    + ['Hue', 'Saturation', 'Value', 'L', 'a', 'b']
+    + ['r_chroma', 'g_chroma', 'b_chroma', 'Red/Green', 'Red/Blue', 'Green/Blue']
+    + [f'{c}_p{p}' for c in CHANNELS for p in PERCENTILES]
+)
+
+_LEVELS = np.arange(256, dtype=np.float64)
+
+
+def _histogram_percentiles(hist, lut, percentiles):
+    """按查找表映射后的值计算直方图的分位数（取累计计数首次达到 p% 的灰度级）"""
+    order = np.argsort(lut, kind='stable')
+    cumulative = np.cumsum(hist[order])
+    total = cumulative[-1]
+    if total == 0:
+        return [0.0] * len(percentiles)
+    positions = np.searchsorted(cumulative, [total * p / 100 for p in percentiles])
+    return [float(lut[order[min(i, 255)]]) for i in positions]
+
+
+def extract_color_features(img, truncate=True, strip_pixels=STRIP_PIXELS):
+    """BGR 图像的扩展颜色特征，返回 (按 FEATURE_NAMES 排列的字典, 中心区域坐标)
+
+    Red/Green/Blue 与 extract_rgb 的结果逐位一致；truncate 的含义与 white_balanced_center_mean 相同。
+    """
+    height, width = img.shape[:2]
+    white = corner_white_average(img)
+    correction_factor = IDEAL_WHITE / white
+
+    x, y, w, h = center_box(height, width)
+    roi = img[y:y + h, x:x + w]
+    hist = channel_histograms(roi, strip_pixels)
+    means = corrected_mean(hist, correction_factor, truncate)
+
+    features = {}
+    luts = []
+    for name, c in zip(CHANNELS, _BGR_INDEX):
+        lut = np.clip(_LEVELS * correction_factor[c], 0, 255)
+        if truncate:
+            lut = np.floor(lut)
+        luts.append(lut)
+        features[name] = means[c]
+
+    # 光密度以四角白色为参考，0 灰度按 0.5 处理避免 log(0)
+    for name, c in zip(CHANNELS, _BGR_INDEX):
+        od_lut = -np.log10(np.maximum(_LEVELS, 0.5) / white[c])
+        n = hist[c].sum()
+        features[f'OD_{name}'] = float(np.dot(hist[c], od_lut) / n) if n else 0.0
+
+    # HSV、Lab：白平衡查找表作用在缩小后的区域上，再由 OpenCV 转换
+    balance = np.stack([np.clip(_LEVELS * correction_factor[c], 0, 255) for c in range(3)], axis=-1)
+    small = cv2.LUT(shrink(roi, FEATURE_PIXELS), np.round(balance).astype(np.uint8).reshape(256, 1, 3))
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV_FULL).reshape(-1, 3).astype(np.float64)
+    # 色相是角度，按圆周平均
+    angle = hsv[:, 0] * (2 * np.pi / 256)
+    hue = np.degrees(np.arctan2(np.sin(angle).mean(), np.cos(angle).mean())) % 360
+    features['Hue'] = float(hue)
+    features['Saturation'] = float(hsv[:, 1].mean() / 255)
+    features['Value'] = float(hsv[:, 2].mean() / 255)
+    lab = cv2.cvtColor(small.astype(np.float32) / 255, cv2.COLOR_BGR2LAB).reshape(-1, 3)
+    features['L'], features['a'], features['b'] = (float(v) for v in lab.mean(axis=0))
+
+    red, green, blue = (features[c] for c in CHANNELS)
+    total = red + green + blue
+    features['r_chroma'] = red / total if total else 0.0
+    features['g_chroma'] = green / total if total else 0.0
+    features['b_chroma'] = blue / total if total else 0.0
+    features['Red/Green'] = red / green if green else 0.0
+    features['Red/Blue'] = red / blue if blue else 0.0
+    features['Green/Blue'] = green / blue if blue else 0.0
+
+    for name, c, lut in zip(CHANNELS, _BGR_INDEX, luts):
+        for p, value in zip(PERCENTILES, _histogram_percentiles(hist[c], lut, PERCENTILES)):
+            features[f'{name}_p{p}'] = value
+
+    return {name: float(features[name]) for name in FEATURE_NAMES}, (x, y, w, h)
+
+
+if __name__ == '__main__':
+    # 在现有图片上核对 RGB 与 extract_rgb 一致，并比较两者的耗时
+    import glob
+    import time
+
+    from pipeline import extract_rgb
+
+    paths = sorted(glob.glob('../Data/**/*.png', recursive=True))[:200]
+    images = [cv2.imread(p) for p in paths]
+    images.append(cv2.resize(images[0], (3000, 4000), interpolation=cv2.INTER_LINEAR))
+
+    max_error = 0.0
+    for image in images:
+        rgb, _ = extract_rgb(image)
+        features, _ = extract_color_features(image)
+        max_error = max(max_error, *(abs(rgb[c.lower()] - features[c]) for c in CHANNELS))
+    print(f'{len(images)} 张图片，RGB 与 extract_rgb 的最大差异 {max_error:.2e}')
+
+    for label, batch in (('数据集图片', images[:-1]), ('4000×3000 图片', images[-1:] * 5)):
+        start = time.perf_counter()
+        for image in batch:
+            extract_rgb(image)
+        rgb_time = (time.perf_counter() - start) / len(batch)
+        start = time.perf_counter()
+        for image in batch:
+            extract_color_features(image)
+        feature_time = (time.perf_counter() - start) / len(batch)
+        print(f'{label}: extract_rgb {rgb_time * 1e3:.2f} 毫秒，extract_color_features {feature_time * 1e3:.2f} 毫秒'
+              f'（{len(FEATURE_NAMES)} 个特征）')
@@ -0,0 +1,172 @@
+"""把训练脚本用到的 *-output_rgb_values.xlsx 合并成一个 .npz 列式数据集
+
+每一列单独存成 npz 中的一个数组，读取时只解压需要的列；每行带有 collection、dye、catalyst、
+scavenger、source 元数据列。数据集里记录了所有源文件的大小和修改时间，
+源文件有增删改时 load() 会自动重新生成，不需要手动维护。
+
+    python dataset_store.py                  # 重新生成并打印各分组的行数
+    from dataset_store import load
+    data = load('all_blue', columns=['Red', 'Green', 'Blue', 'Absorbance'], filters={'scavenger': 'none'})
+"""
+import glob
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+STORE_PATH = '../Data/dataset.npz'
+
+# 分组名 -> 源文件 glob，对应原来各训练脚本里写死的目录
+COLLECTIONS = {
+    'all_blue': '../Data/ALL-Blue-Data/*.xlsx',
+    'all_orange': '../Data/ALL-Orange-Data/*.xlsx',
+    'purple_blue': '../newData/purple/blueAllData/*.xlsx',
+    'purple_orange': '../newData/purple/orangeAllData/*.xlsx',
+}
+
+NUMERIC_COLUMNS = ('Absorbance', 'Concentration', 'Red', 'Green', 'Blue')
+META_COLUMNS = ('collection', 'dye', 'catalyst', 'scavenger', 'source')
+SOURCES_KEY = '__sources__'
+
+# 文件名里大小写不统一（3-pt-orange、4-pt-TiO2），统一写法
+_CANONICAL = {name.lower(): name for name in ('Ag', 'Au', 'Pt', 'NF', 'CdS', 'TiO2')}
+
+# 4-Ag-blue-1-isopropanol、3-pt-orange-2-triethanolamine
+_SCAVENGER_NAME = re.compile(r'^\d+-(?P<catalyst>[^-]+)-(?P<dye>blue|orange)-\d+-(?P<scavenger>.+)$', re.I)
+# 9-catalyzer-blue-3-Au-TiO2、8-catalyzer-orange-6-only
+_CATALYZER_NAME = re.compile(r'^\d+-catalyzer-(?P<dye>blue|orange)-\d+-(?P<catalyst>.+)$', re.I)
+# 1-standard-methyl-orange、2-standard-methylene-blue
+_STANDARD_NAME = re.compile(r'^\d+-standard-.*(?P<dye>blue|orange)$', re.I)
+# blue-Ag（newData/purple 下的文件）
+_PURPLE_NAME = re.compile(r'^(?P<dye>blue|orange)-(?P<catalyst>.+)$', re.I)
+
+
+def _canonical(name):
+    return '-'.join(_CANONICAL.get(part.lower(), part) for part in name.split('-'))
+
+
+def parse_source_name(path):
+    """从文件名解析 (染料, 催化剂, 捕获剂)，无法识别的部分为 'unknown'"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    stem = stem.replace('-output_rgb_values', '')
+    # catalyzer 的文件名也符合捕获剂的格式，要先判断
+    match = _CATALYZER_NAME.match(stem)
+    if match:
+        catalyst = _canonical(match['catalyst'])
+        return match['dye'].lower(), 'none' if catalyst == 'only' else catalyst, 'none'
+    match = _SCAVENGER_NAME.match(stem)
+    if match:
+        return match['dye'].lower(), _canonical(match['catalyst']), match['scavenger'].lower()
+    match = _STANDARD_NAME.match(stem)
+    if match:
+        return match['dye'].lower(), 'standard', 'none'
+    match = _PURPLE_NAME.match(stem)
+    if match:
+        return match['dye'].lower(), _canonical(match['catalyst']), 'none'
+    return 'unknown', 'unknown', 'unknown'
+
+
+def source_files():
+    """返回 [(分组名, 路径), ...]，排除 Excel 的临时文件（以~$开头的文件）"""
+    files = []
+    for collection, pattern in COLLECTIONS.items():
+        for path in sorted(glob.glob(pattern)):
+            if not os.path.basename(path).startswith('~$'):
+                files.append((collection, path))
+    return files
+
+
+def fingerprint(files):
+    """源文件的路径、大小和修改时间，任何一项变化都需要重新生成"""
+    entries = []
+    for collection, path in files:
+        stat = os.stat(path)
+        entries.append([collection, path.replace('\\', '/'), stat.st_size, stat.st_mtime_ns])
+    return entries
+
+
+def build(path=STORE_PATH):
+    """读取全部源文件并写出数据集，返回合并后的 DataFrame"""
+    files = source_files()
+    frames = []
+    for collection, source in files:
+        data = pd.read_excel(source)
+        dye, catalyst, scavenger = parse_source_name(source)
+        frame = pd.DataFrame({column: data[column] if column in data.columns else np.nan
+                              for column in NUMERIC_COLUMNS}, dtype=np.float64)
+        frame['collection'] = collection
+        frame['dye'] = dye
+        frame['catalyst'] = catalyst
+        frame['scavenger'] = scavenger
+        frame['source'] = os.path.basename(source)
+        frames.append(frame)
+    if frames:
+        data = pd.concat(frames, ignore_index=True)
+    else:
+        data = pd.DataFrame({column: pd.Series(dtype=np.float64) for column in NUMERIC_COLUMNS})
+        for column in META_COLUMNS:
+            data[column] = pd.Series(dtype=str)
+
+    arrays = {column: data[column].to_numpy(dtype=np.float64) for column in NUMERIC_COLUMNS}
+    arrays.update({column: data[column].to_numpy(dtype=str) for column in META_COLUMNS})
+    arrays[SOURCES_KEY] = np.array(json.dumps(fingerprint(files)))
+
+    # 先写临时文件再替换，训练脚本不会读到写了一半的数据集
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return data
+
+
+def _is_stale(path):
+    if not os.path.exists(path):
+        return True
+    try:
+        with np.load(path, allow_pickle=False) as store:
+            stored = json.loads(str(store[SOURCES_KEY]))
+    except (OSError, KeyError, ValueError):
+        return True
+    return stored != fingerprint(source_files())
+
+
+def load(collections=None, columns=None, filters=None, path=STORE_PATH):
+    """读取数据集，源文件有变化时先重新生成
+
+    collections: 分组名或分组名列表（见 COLLECTIONS），None 表示全部
+    columns: 需要的列，None 表示全部数值列和元数据列
+    filters: {列名: 值或值列表}，例如 {'catalyst': ['Ag', 'Au'], 'scavenger': 'none'}
+    """
+    if _is_stale(path):
+        build(path)
+    if columns is None:
+        columns = list(NUMERIC_COLUMNS + META_COLUMNS)
+    filters = dict(filters or {})
+    if collections is not None:
+        filters['collection'] = collections
+
+    with np.load(path, allow_pickle=False) as store:
+        mask = None
+        for column, values in filters.items():
+            values = [values] if isinstance(values, str) or np.isscalar(values) else list(values)
+            selected = np.isin(store[column], values)
+            mask = selected if mask is None else mask & selected
+        data = {}
+        for column in columns:
+            values = store[column]
+            data[column] = values if mask is None else values[mask]
+    return pd.DataFrame(data, columns=columns)
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    data = build()
+    print(f'已生成 {STORE_PATH}：{len(data)} 行，{len(source_files())} 个源文件，耗时 {time.perf_counter() - start:.2f} 秒')
+    print(data.groupby(['collection', 'dye', 'catalyst', 'scavenger']).size().to_string())
+
+    start = time.perf_counter()
+    load('all_blue', columns=['Red', 'Green', 'Blue', 'Absorbance'])
+    print(f'读取 all_blue 四列耗时 {(time.perf_counter() - start) * 1000:.1f} 毫秒')
@@ -0,0 +1,252 @@
+"""批量提取 Data/ 下照片的 RGB 特征
+
+代替 0-clearwhite_standard.py、1-standard-methyl-orange.py 等脚本里写死 image_dir、逐个目录串行处理的做法：
+一次遍历所有目录，用多进程提取，文件名（如 0.128.png）解析为吸光度。
+每个根目录下保存一份 rgb_manifest.json，记录每张图片的大小、修改时间、哈希和提取结果，
+再次运行时只重新提取新增或改动过的图片，只重写有变化的目录的 xlsx。
+默认只列出会重写的文件，不改动任何文件（Data/ 下的 xlsx 已提交，且有的故意去掉了部分图片），加 --force 才写出。
+--method features 提取 color_features 中的全部扩展特征，写到 *-output_features.xlsx（清单为 feature_manifest.json）。
+
+只处理 Data/ 这种“每个目录一个 *-output_rgb_values.xlsx”的布局。newData/ 下训练用的表是四角白平衡后的结果，
+由各自的脚本写到别处、用各自的文件名（如 purple/blueAllData/blue-Ag.xlsx、standard/blue/11-20blue.xlsx、
+purple/orange/Ag/orange-Ag-origin.xlsx），这里的输出不会更新它们，所以拒绝处理 newData/ 下的目录。
+
+    python extract_features.py                       # 默认处理 ../Data，只列出要写的文件
+    python extract_features.py ../Data/9-catalyzer-blue --jobs 8 --force
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import pandas as pd
+
+from color_features import FEATURE_NAMES, extract_color_features
+from rgb_extract import white_balanced_center_mean
+
+MANIFEST_NAME = 'rgb_manifest.json'
+OUTPUT_SUFFIX = '-output_rgb_values.xlsx'
+FEATURES_MANIFEST_NAME = 'feature_manifest.json'
+FEATURES_OUTPUT_SUFFIX = '-output_features.xlsx'
+# plain：中心区域直接求平均（Data/ 下已有的 xlsx 用的是这种）；white：按四角白色校正后求平均（不截断）；
+# features：四角白平衡后的扩展颜色特征（RGB、光密度、HSV、Lab、比值、分位数）
+METHODS = ('plain', 'white', 'features')
+RGB_COLUMNS = ['Red', 'Green', 'Blue']
+# 图片数少于这个值时不启动进程池
+MIN_PARALLEL = 16
+
+
+def parse_label(filename):
+    """从文件名解析吸光度，例如 0.128.png -> 0.128，不是数字的文件名返回 None"""
+    stem, ext = os.path.splitext(filename)
+    if ext.lower() != '.png':
+        return None
+    try:
+        return float(stem)
+    except ValueError:
+        return None
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def extract_file(path, method):
+    """提取一张图片中心区域的平均 RGB，返回 [R, G, B]（features 时按 FEATURE_NAMES 排列），无法打开时返回 None"""
+    image = cv2.imread(path)
+    if image is None:
+        return None
+    if method == 'features':
+        features, _ = extract_color_features(image)
+        return [features[name] for name in FEATURE_NAMES]
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if method == 'white':
+        average_color, _ = white_balanced_center_mean(image, truncate=False)
+        return [float(v) for v in average_color]
+    h, w = image.shape[:2]
+    # 与原来逐目录的脚本相同的中心区域（尺寸为奇数时与 center_box 差一个像素）
+    roi = image[h // 4:3 * h // 4, w // 4:3 * w // 4]
+    return [float(v) for v in cv2.mean(roi)[:3]]
+
+
+def _extract_job(job):
+    rel, path, digest, method = job
+    return rel, digest, extract_file(path, method)
+
+
+def scan_images(root):
+    """返回 {目录相对路径: [(文件名, 吸光度), ...]}，只包含文件名能解析为数字的 png"""
+    groups = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        images = [(name, parse_label(name)) for name in sorted(filenames)]
+        images = [(name, label) for name, label in images if label is not None]
+        if images:
+            groups[os.path.relpath(dirpath, root)] = images
+    return groups
+
+
+def manifest_name(method):
+    return FEATURES_MANIFEST_NAME if method == 'features' else MANIFEST_NAME
+
+
+def value_columns(method):
+    return list(FEATURE_NAMES) if method == 'features' else RGB_COLUMNS
+
+
+def load_manifest(root, method='plain'):
+    path = os.path.join(root, manifest_name(method))
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"清单文件无法读取，将全部重新提取: {path} ({e})")
+        return {}
+
+
+def save_manifest(root, manifest, method='plain'):
+    path = os.path.join(root, manifest_name(method))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def output_path(root, rel_dir, method='plain'):
+    """输出文件路径：目录中已有 *-output_rgb_values.xlsx 时沿用它的文件名（大小写不一定与目录一致），
+    没有时按约定用目录相对路径以 - 连接，例如 9-catalyzer-blue-6-TiO2-output_rgb_values.xlsx"""
+    if rel_dir == '.':
+        prefix = os.path.basename(os.path.abspath(root))
+    else:
+        prefix = rel_dir.replace(os.sep, '-')
+    suffix = FEATURES_OUTPUT_SUFFIX if method == 'features' else OUTPUT_SUFFIX
+    directory = os.path.join(root, rel_dir)
+    existing = sorted(name for name in os.listdir(directory) if name.lower().endswith(suffix.lower()))
+    for name in existing:
+        if name.lower() == (prefix + suffix).lower():
+            return os.path.join(directory, name)
+    if len(existing) == 1:
+        return os.path.join(directory, existing[0])
+    return os.path.join(directory, prefix + suffix)
+
+
+def write_table(path, rows, columns=RGB_COLUMNS):
+    """按吸光度排序写出 xlsx；已有文件中的其他列（如 Concentration）按吸光度保留"""
+    df = pd.DataFrame(rows, columns=['Absorbance'] + list(columns)).sort_values(by='Absorbance')
+    if os.path.exists(path):
+        try:
+            old = pd.read_excel(path)
+        except Exception as e:
+            print(f"无法读取已有文件，直接覆盖: {path} ({e})")
+            old = None
+        if old is not None and 'Absorbance' in old.columns:
+            extra = [c for c in old.columns if c not in df.columns]
+            if extra:
+                old = old[['Absorbance'] + extra].drop_duplicates(subset='Absorbance')
+                df = df.merge(old, on='Absorbance', how='left')
+                df = df[['Absorbance'] + extra + list(columns)]
+    df.to_excel(path, index=False)
+
+
+def process_root(root, method, jobs, full=False, write=False):
+    """增量处理一个根目录，返回 (图片数, 重新提取数, 需要写出的文件列表)
+
+    write 为 False 时只提取和比较，不写 xlsx 和清单；full 为 True 时忽略清单全部重新提取。
+    """
+    groups = scan_images(root)
+    old_manifest = {} if full else load_manifest(root, method)
+    manifest = {}
+    pending = []
+
+    for rel_dir, images in groups.items():
+        for name, label in images:
+            rel = os.path.join(rel_dir, name) if rel_dir != '.' else name
+            path = os.path.join(root, rel)
+            stat = os.stat(path)
+            entry = old_manifest.get(rel)
+            if entry is not None and entry.get('method') == method and entry.get('rgb') is not None:
+                # 大小和修改时间都没变，直接复用；只有修改时间变了，再比较一次哈希
+                if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                    manifest[rel] = entry
+                    continue
+                digest = file_hash(path)
+                if entry['sha1'] == digest:
+                    manifest[rel] = dict(entry, size=stat.st_size, mtime=stat.st_mtime)
+                    continue
+            else:
+                digest = file_hash(path)
+            manifest[rel] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': digest,
+                             'method': method, 'label': label, 'rgb': None}
+            pending.append((rel, path, digest, method))
+
+    if pending:
+        if jobs > 1 and len(pending) >= MIN_PARALLEL:
+            with ProcessPoolExecutor(jobs) as executor:
+                outcomes = list(executor.map(_extract_job, pending, chunksize=max(1, len(pending) // (jobs * 4))))
+        else:
+            outcomes = [_extract_job(job) for job in pending]
+        for rel, digest, rgb in outcomes:
+            if rgb is None:
+                print(f"无法打开文件: {os.path.join(root, rel)}")
+            manifest[rel]['rgb'] = rgb
+
+    # 图片有增删改，或者输出文件不存在的目录才重写
+    changed_dirs = {os.path.dirname(rel) or '.' for rel, _, _, _ in pending}
+    changed_dirs |= {os.path.dirname(rel) or '.' for rel in old_manifest if rel not in manifest}
+    written = []
+    for rel_dir, images in groups.items():
+        path = output_path(root, rel_dir, method)
+        if rel_dir not in changed_dirs and os.path.exists(path):
+            continue
+        rows = []
+        for name, label in images:
+            rgb = manifest[os.path.join(rel_dir, name) if rel_dir != '.' else name]['rgb']
+            if rgb is not None:
+                rows.append([label] + rgb)
+        if rows:
+            if write:
+                write_table(path, rows, value_columns(method))
+            written.append(path)
+
+    if write:
+        save_manifest(root, manifest, method)
+    return len(manifest), len(pending), written
+
+
+def is_new_data(root):
+    """root 是否在 newData/ 下（这里的输出不是 newData 训练数据实际使用的文件，不处理）"""
+    return 'newData' in os.path.realpath(root).split(os.sep)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('roots', nargs='*', default=['../Data'], help='要处理的根目录（Data/ 或其子目录）')
+    parser.add_argument('--method', choices=METHODS, default='plain')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='进程数')
+    parser.add_argument('--full', action='store_true', help='忽略清单，全部重新提取')
+    parser.add_argument('--force', action='store_true', help='写出 xlsx 和清单（默认只列出会写的文件）')
+    args = parser.parse_args()
+
+    rejected = [root for root in args.roots if is_new_data(root)]
+    if rejected:
+        parser.error(f"不处理 newData/ 下的目录（训练数据由各自的白平衡脚本生成，文件名和位置不同）: {', '.join(rejected)}")
+
+    for root in args.roots:
+        start = time.perf_counter()
+        total, extracted, written = process_root(root, args.method, args.jobs, args.full, args.force)
+        for path in written:
+            print(f"RGB值已保存到 {path}" if args.force else f"将写出 {path}")
+        print(f"{root}: {total} 张图片，重新提取 {extracted} 张，{'写出' if args.force else '需要写出'} {len(written)} 个文件，"
+              f"耗时 {time.perf_counter() - start:.2f} 秒")
+    if not args.force:
+        print("未写出任何文件，确认后加 --force 写出")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""只用 X'X 和 X'Y 交叉积矩阵拟合 PLS 的 NumPy 实现，针对 RGB 这种只有几列的特征
+
+参考 back-end/matlab/lib_cguo/simpls.m 的做法，整个迭代只在 p×p 和 p×m 的小矩阵上进行，
+与样本数无关：样本只在计算交叉积时遍历一次。这里用的是 Dayal & MacGregor 的改进核算法，
+单目标（PLS1）时与 SIMPLS、NIPALS 完全等价，多目标（PLS2）时与 sklearn PLSRegression
+的 NIPALS（regression 形式的收缩）等价，因此预测结果可以和 sklearn 逐位对照。
+
+一次拟合同时得到 1..A 个成分的全部回归系数，选成分数时不需要重复拟合。
+"""
+import numpy as np
+
+
+class CrossProducts:
+    """样本的充分统计量：样本数、平移后的一阶和二阶交叉积
+
+    所有统计量都减去同一个平移量 shift（通常取全体样本的均值）后再累加，
+    避免 RGB 这种远离 0 的数据在“平方和 - n·均值²”时损失精度。
+    平移量相同的两份统计量可以直接相加或相减，用于交叉验证时从全体中扣除一折。
+    """
+
+    def __init__(self, n, sum_x, sum_y, xx, xy, yy, shift_x, shift_y):
+        self.n = n
+        self.sum_x = sum_x
+        self.sum_y = sum_y
+        self.xx = xx
+        self.xy = xy
+        self.yy = yy
+        self.shift_x = shift_x
+        self.shift_y = shift_y
+
+    @classmethod
+    def from_data(cls, X, Y, shift_x=None, shift_y=None):
+        X = np.asarray(X, dtype=np.float64)
+        Y = np.asarray(Y, dtype=np.float64)
+        if Y.ndim == 1:
+            Y = Y.reshape(-1, 1)
+        if shift_x is None:
+            shift_x = X.mean(axis=0)
+        if shift_y is None:
+            shift_y = Y.mean(axis=0)
+        Xs = X - shift_x
+        Ys = Y - shift_y
+        return cls(len(X), Xs.sum(axis=0), Ys.sum(axis=0), Xs.T @ Xs, Xs.T @ Ys,
+                   np.einsum('ij,ij->j', Ys, Ys), shift_x, shift_y)
+
+    def _combine(self, other, sign):
+        if not (np.array_equal(self.shift_x, other.shift_x) and np.array_equal(self.shift_y, other.shift_y)):
+            raise ValueError('两份统计量的平移量不同，不能合并')
+        return CrossProducts(self.n + sign * other.n, self.sum_x + sign * other.sum_x,
+                             self.sum_y + sign * other.sum_y, self.xx + sign * other.xx,
+                             self.xy + sign * other.xy, self.yy + sign * other.yy,
+                             self.shift_x, self.shift_y)
+
+    def __add__(self, other):
+        return self._combine(other, 1)
+
+    def __sub__(self, other):
+        return self._combine(other, -1)
+
+    @property
+    def x_mean(self):
+        return self.shift_x + self.sum_x / self.n
+
+    @property
+    def y_mean(self):
+        return self.shift_y + self.sum_y / self.n
+
+    def centered(self):
+        """中心化后的 (X'X, X'Y, 每个 y 的平方和)"""
+        mx = self.sum_x / self.n
+        my = self.sum_y / self.n
+        cxx = self.xx - self.n * np.outer(mx, mx)
+        cxy = self.xy - self.n * np.outer(mx, my)
+        cyy = self.yy - self.n * my * my
+        return cxx, cxy, cyy
+
+
+def _kernel_pls(cxx, cxy, n_components):
+    """改进核算法，返回 (R, Q)：X 权重（已扣除前面成分的影响）和 Y 载荷
+
+    第 a 个成分的回归系数为 R[:, :a] @ Q[:, :a].T
+    """
+    n_features, n_targets = cxy.shape
+    R = np.zeros((n_features, n_components))
+    P = np.zeros((n_features, n_components))
+    Q = np.zeros((n_targets, n_components))
+    cxy = cxy.copy()
+    scale = np.trace(cxx)
+    for a in range(n_components):
+        if n_targets == 1:
+            w = cxy[:, 0].copy()
+        else:
+            w = np.linalg.svd(cxy, full_matrices=False)[0][:, 0]
+        norm = np.linalg.norm(w)
+        if norm == 0:
+            return R[:, :a], Q[:, :a]
+        w /= norm
+        r = w - R[:, :a] @ (P[:, :a].T @ w)
+        tt = r @ cxx @ r
+        # X 已经被前面的成分完全解释（秩不足），后面的成分没有意义
+        if tt <= scale * 1e-14:
+            return R[:, :a], Q[:, :a]
+        p = cxx @ r / tt
+        q = r @ cxy / tt
+        cxy -= tt * np.outer(p, q)
+        R[:, a] = r
+        P[:, a] = p
+        Q[:, a] = q
+    return R, Q
+
+
+class FastPLS:
+    """在交叉积上拟合的 PLS 模型，保存 1..A 个成分对应的全部系数
+
+    coef_[a - 1] 和 intercept_[a - 1] 是 a 个成分时原始尺度上的系数 (p, m) 和偏置 (m,)，
+    即 Y = X @ coef_[a - 1] + intercept_[a - 1]。
+    scale=True 时与 sklearn PLSRegression 的默认行为一致，先把 X 和 Y 的每列按标准差（ddof=1）缩放。
+    joint=True 为 PLS2（所有目标一起拟合）；joint=False 为每个目标单独拟合 PLS1，
+    对应训练脚本里吸光度和浓度各用一个 PLSRegression 的做法。
+    """
+
+    def __init__(self, n_components=3, scale=True, joint=False):
+        self.n_components = n_components
+        self.scale = scale
+        self.joint = joint
+
+    def fit(self, X, Y):
+        return self.fit_cross_products(CrossProducts.from_data(X, Y))
+
+    def fit_cross_products(self, stats):
+        cxx, cxy, cyy = stats.centered()
+        n_features, n_targets = cxy.shape
+        n_components = min(self.n_components, n_features, stats.n - 1)
+
+        if self.scale:
+            x_std = np.sqrt(np.diag(cxx) / (stats.n - 1))
+            y_std = np.sqrt(cyy / (stats.n - 1))
+            x_std[x_std == 0] = 1.0
+            y_std[y_std == 0] = 1.0
+        else:
+            x_std = np.ones(n_features)
+            y_std = np.ones(n_targets)
+        cxx = cxx / np.outer(x_std, x_std)
+        cxy = cxy / np.outer(x_std, y_std)
+
+        # 每个成分数下缩放空间的系数，成分数不足时沿用最后一个可用成分数的结果
+        coef = np.zeros((n_components, n_features, n_targets))
+        groups = [slice(None)] if self.joint else [slice(j, j + 1) for j in range(n_targets)]
+        for columns in groups:
+            R, Q = _kernel_pls(cxx, cxy[:, columns], n_components)
+            partial = np.zeros((n_features, Q.shape[0]))
+            for a in range(n_components):
+                if a < R.shape[1]:
+                    partial = partial + np.outer(R[:, a], Q[:, a])
+                coef[a][:, columns] = partial
+
+        self.coef_ = coef / x_std[None, :, None] * y_std[None, None, :]
+        self.intercept_ = stats.y_mean - np.einsum('p,apm->am', stats.x_mean, self.coef_)
+        self.n_components_ = n_components
+        self.x_mean_ = stats.x_mean
+        self.y_mean_ = stats.y_mean
+        return self
+
+    def predict(self, X, n_components=None):
+        """n_components 为 None 时使用拟合时的最大成分数，返回 (n, m)"""
+        a = self.n_components_ if n_components is None else n_components
+        return np.asarray(X, dtype=np.float64) @ self.coef_[a - 1] + self.intercept_[a - 1]
+
+    def predict_all(self, X):
+        """一次得到 1..A 个成分的全部预测结果，形状 (A, n, m)"""
+        X = np.asarray(X, dtype=np.float64)
+        return np.einsum('np,apm->anm', X, self.coef_) + self.intercept_[:, None, :]
+
+
+def _fold_indices(cv, n):
+    """cv 可以是折数、sklearn 的划分器，或 [(训练索引, 测试索引), ...]；只用到测试索引"""
+    if isinstance(cv, int):
+        from sklearn.model_selection import KFold
+        cv = KFold(n_splits=cv)
+    if hasattr(cv, 'split'):
+        cv = cv.split(np.zeros((n, 1)))
+    return [np.asarray(test) for _, test in cv]
+
+
+class CVResult:
+    """一次交叉验证的全部结果，数组的第一维是成分数 1..A，最后一维是目标
+
+    predictions: (A, n, m) 交叉验证预测值
+    rmsecv / r2 / bias / rpd: (A, m) 汇总全部折的预测后计算
+    fold_rmse / fold_r2: (A, 折数, m) 每一折单独计算，对应 cross_val_score 的结果
+    best_n_components: (m,) 每个目标 RMSECV 最小的成分数
+    """
+
+    def __init__(self, Y, predictions, folds):
+        self.predictions = predictions
+        self.folds = folds
+        errors = predictions - Y[None]
+        n = len(Y)
+        y_centered = Y - Y.mean(axis=0)
+        self.press = np.einsum('anm,anm->am', errors, errors)
+        self.rmsecv = np.sqrt(self.press / n)
+        self.r2 = 1 - self.press / np.einsum('nm,nm->m', y_centered, y_centered)
+        self.bias = errors.mean(axis=1)
+        self.rpd = Y.std(axis=0, ddof=1) / self.rmsecv
+
+        self.fold_rmse = np.zeros((len(predictions), len(folds), Y.shape[1]))
+        self.fold_r2 = np.zeros_like(self.fold_rmse)
+        for k, test in enumerate(folds):
+            fold_press = np.einsum('anm,anm->am', errors[:, test], errors[:, test])
+            fold_centered = Y[test] - Y[test].mean(axis=0)
+            self.fold_rmse[:, k] = np.sqrt(fold_press / len(test))
+            self.fold_r2[:, k] = 1 - fold_press / np.einsum('nm,nm->m', fold_centered, fold_centered)
+
+        self.best_n_components = np.argmin(self.rmsecv, axis=0) + 1
+
+    def summary(self, n_components):
+        """各项汇总指标在给定成分数下的值（每项形状为 (m,)），n_components 可以是整数或每个目标一个的数组"""
+        index = np.broadcast_to(np.asarray(n_components) - 1, self.rmsecv.shape[1:])
+        columns = np.arange(self.rmsecv.shape[1])
+        return {name: getattr(self, name)[index, columns] for name in ('rmsecv', 'r2', 'bias', 'rpd')}
+
+
+def cross_validate(X, Y, max_components=3, cv=5, scale=True, joint=False):
+    """对 1..max_components 个成分同时做交叉验证
+
+    先算一次全体样本的交叉积，每一折的训练模型由全体减去该折的交叉积得到，
+    不需要重新遍历训练样本；一次拟合就得到全部成分数的预测，所有指标在一遍里算完。
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y.reshape(-1, 1)
+    folds = _fold_indices(cv, len(X))
+    total = CrossProducts.from_data(X, Y)
+    max_components = min(max_components, X.shape[1], min(len(X) - len(test) for test in folds) - 1)
+
+    predictions = np.zeros((max_components, len(X), Y.shape[1]))
+    for test in folds:
+        held_out = CrossProducts.from_data(X[test], Y[test], total.shift_x, total.shift_y)
+        model = FastPLS(max_components, scale=scale, joint=joint).fit_cross_products(total - held_out)
+        predictions[:, test] = model.predict_all(X[test])
+    return CVResult(Y, predictions, folds)
+
+
+if __name__ == '__main__':
+    # 在现有数据上与 sklearn PLSRegression 对照，并比较拟合耗时
+    import time
+    import warnings
+
+    from sklearn.cross_decomposition import PLSRegression
+    from sklearn.preprocessing import StandardScaler
+
+    from dataset_store import load
+
+    for collection in ('all_blue', 'all_orange'):
+        data = load(collection, columns=['Red', 'Green', 'Blue', 'Absorbance', 'Concentration'])
+        X = data[['Red', 'Green', 'Blue']].values
+        Y = data[['Absorbance', 'Concentration']].values
+        # 与训练脚本一致：先用 StandardScaler 标准化
+        X_scaled = StandardScaler().fit_transform(X)
+
+        for joint in (False, True):
+            model = FastPLS(n_components=3, joint=joint).fit(X_scaled, Y)
+            errors = []
+            for a in range(1, 4):
+                if joint:
+                    expected = PLSRegression(n_components=a, tol=1e-15, max_iter=10000).fit(X_scaled, Y).predict(X_scaled)
+                else:
+                    expected = np.column_stack([PLSRegression(n_components=a).fit(X_scaled, Y[:, j]).predict(X_scaled).ravel()
+                                                for j in range(Y.shape[1])])
+                errors.append(np.max(np.abs(model.predict(X_scaled, a) - expected)))
+
+            repeats = 2000
+            start = time.perf_counter()
+            for _ in range(repeats):
+                FastPLS(n_components=3, joint=joint).fit(X_scaled, Y)
+            fast_time = (time.perf_counter() - start) / repeats
+            start = time.perf_counter()
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                for _ in range(20):
+                    for a in range(1, 4):
+                        PLSRegression(n_components=a).fit(X_scaled, Y)
+            sklearn_time = (time.perf_counter() - start) / 20
+            name = 'PLS2' if joint else 'PLS1'
+            print(f'{collection} {name}: {len(X)} 个样本，1..3 个成分最大误差 '
+                  f'{", ".join(f"{e:.1e}" for e in errors)}；'
+                  f'拟合耗时 {fast_time * 1e6:.0f} 微秒（sklearn 逐个成分数拟合 {sklearn_time * 1e3:.1f} 毫秒）')
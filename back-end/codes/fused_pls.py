@@ -0,0 +1,91 @@
+import numpy as np
+
+from applicability import check, compose_scaler, domain_from_scores
+
+
+def sklearn_predict(X, scaler_X, pls_absorbance_model, pls_concentration_model,
+                    scaler_y_absorbance, scaler_y_concentration):
+    """原始的 sklearn 预测路径：标准化 -> 两个 PLS 模型 -> 两次反标准化，返回 (n, 2) 的 [吸光度, 浓度]"""
+    X_scaled = scaler_X.transform(X)
+    absorbance = scaler_y_absorbance.inverse_transform(pls_absorbance_model.predict(X_scaled).reshape(-1, 1)).ravel()
+    concentration = scaler_y_concentration.inverse_transform(
+        pls_concentration_model.predict(X_scaled).reshape(-1, 1)).ravel()
+    return np.column_stack((absorbance, concentration))
+
+
+class FusedPLSPredictor:
+    """把 scaler_X、两个 PLS 模型和两个 scaler_y 合并成一个仿射映射 Y = X @ coef_ + intercept_
+
+    标准化、PLS 预测和反标准化都是仿射变换，复合后仍是仿射变换，
+    所以在原点和三个单位向量上各跑一次 sklearn 路径就能精确得到 3x2 的系数矩阵和偏置。
+    这样不依赖各个 sklearn 版本 PLSRegression 内部属性的具体含义。
+    """
+
+    def __init__(self, scaler_X, pls_absorbance_model, pls_concentration_model,
+                 scaler_y_absorbance, scaler_y_concentration, tol=1e-8):
+        self.models = (scaler_X, pls_absorbance_model, pls_concentration_model,
+                       scaler_y_absorbance, scaler_y_concentration)
+        n_features = scaler_X.n_features_in_
+
+        probes = np.vstack((np.zeros((1, n_features)), np.eye(n_features)))
+        outputs = sklearn_predict(probes, *self.models)
+        self.intercept_ = outputs[0]
+        self.coef_ = outputs[1:] - outputs[0]
+
+        # 合并后立即与 sklearn 路径核对一次，防止模型不是仿射的（例如换了非线性预处理）
+        self.check_parity(tol=tol)
+
+        # 训练时保存的适用域，把 scaler_X 合并进去后直接在原始 RGB 上检查；
+        # 旧模型没有保存时由 x_scores_ 重建，仍然没有则为 None
+        domain = getattr(pls_absorbance_model, 'applicability_', None)
+        if domain is None:
+            domain = domain_from_scores(pls_absorbance_model)
+        self.domain = compose_scaler(domain, scaler_X) if domain is not None else None
+
+    def predict_raw(self, X):
+        """不做负值修正的预测结果，形状 (n, 2)，列为 [吸光度, 浓度]"""
+        return np.asarray(X, dtype=np.float64) @ self.coef_ + self.intercept_
+
+    def predict(self, X):
+        """一次矩阵乘法同时得到吸光度和浓度，负值修正为 0"""
+        Y = np.maximum(0, self.predict_raw(X))
+        return Y[:, 0], Y[:, 1]
+
+    def check_domain(self, X):
+        """返回 (T², Q, 是否在适用域内)，模型没有保存适用域时三者都是 None"""
+        if self.domain is None:
+            return None, None, None
+        return check(self.domain, X)
+
+    def check_parity(self, X=None, tol=1e-8):
+        """在给定（或随机的 RGB）样本上比较合并后的结果和 sklearn 路径，返回最大绝对误差"""
+        if X is None:
+            rng = np.random.default_rng(0)
+            X = rng.uniform(0, 255, size=(64, self.coef_.shape[0]))
+        expected = sklearn_predict(X, *self.models)
+        error = np.max(np.abs(self.predict_raw(X) - expected))
+        scale = max(1.0, np.max(np.abs(expected)))
+        if error > tol * scale:
+            raise ValueError(f'合并后的预测与 sklearn 不一致，最大误差 {error}')
+        return error
+
+
+if __name__ == '__main__':
+    # 用现有数据核对合并后的预测器与 sklearn 路径的一致性
+    import os
+    import joblib
+
+    from dataset_store import load
+
+    for color, prefix in (('blue', 'BluePurple'), ('orange', 'OrangePurple')):
+        model_dir = os.path.join('../model', color)
+        predictor = FusedPLSPredictor(
+            joblib.load(os.path.join(model_dir, f'{prefix}-scaler_X_standard.pkl')),
+            joblib.load(os.path.join(model_dir, f'{prefix}-trained_pls_absorbance_model.pkl')),
+            joblib.load(os.path.join(model_dir, f'{prefix}-trained_pls_concentration_model.pkl')),
+            joblib.load(os.path.join(model_dir, f'{prefix}-scaler_y_absorbance_standard.pkl')),
+            joblib.load(os.path.join(model_dir, f'{prefix}-scaler_y_concentration_standard.pkl')),
+        )
+        X = load(f'all_{color}', columns=['Red', 'Green', 'Blue']).values
+        error = predictor.check_parity(X)
+        print(f'{color}: {len(X)} 个样本，最大误差 {error:.3e}')
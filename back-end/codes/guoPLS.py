@@ -3,9 +3,12 @@ import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.preprocessing import StandardScaler
 from sklearn.cross_decomposition import PLSRegression
-from sklearn.model_selection import cross_val_predict, KFold
+from sklearn.model_selection import KFold
 from sklearn.metrics import mean_squared_error
 
+from fast_pls import cross_validate
+from pls_importance import attach_importance
+
 
 # 定义PLS模型类
 class PLSModel:
@@ -35,7 +38,9 @@ class PLSModel:
         ycal_c = self.scaler_y.fit_transform(ycal.reshape(-1, 1)).flatten()
         self.pls.fit(Xcal_c, ycal_c)
         self.coef_ = self.pls.coef_
-        self.VIP_ = self.calculate_vip(Xcal_c, ycal_c)
+        attach_importance(self.pls, Xcal_c)
+        self.VIP_ = self.calculate_vip()
+        self.SR_ = self.pls.selectivity_ratio_
         return self
 
     def predict(self, X):
@@ -45,9 +50,10 @@ class PLSModel:
 
     def cross_validate(self, Xcal, ycal):
         Xcal_c = self.pretreat(Xcal, 'center')
-        ycal_c = self.scaler_y.transform(ycal.reshape(-1, 1)).flatten()
         kf = KFold(n_splits=self.n_fold)
-        yhat_cv = cross_val_predict(self.pls, Xcal_c, ycal_c, cv=kf)
+        # 在原始尺度的 y 上交叉验证（PLS 对 y 的标准化不敏感），预测值与 ycal 可以直接比较
+        cv_result = cross_validate(Xcal_c, ycal, max_components=self.nLV, cv=kf)
+        yhat_cv = cv_result.predictions[min(self.nLV, cv_result.predictions.shape[0]) - 1, :, 0]
         RMSECV, R2cv = self.calc_rmsec(ycal, yhat_cv)
         return RMSECV, R2cv
 
@@ -56,26 +62,9 @@ class PLSModel:
         RMSEP, R2p = self.calc_rmsec(ytest, y_pred)
         return y_pred, RMSEP, R2p
 
-    def calculate_vip(self, X, y):
-        # Fit the model to get t, w, q
-        X_c = self.pretreat(X, 'center')
-        y_c = self.scaler_y.transform(y.reshape(-1, 1)).flatten()
-
-        # Calculate scores, weights, and loadings
-        t = self.pls.x_scores_
-        w = self.pls.x_weights_
-        q = self.pls.y_loadings_
-
-        # VIP calculation
-        p, h = X.shape
-        t2 = t ** 2
-        q2 = q ** 2
-        s = np.diag(np.dot(t2, q2.T))  # Calculate the VIP contribution
-        total_s = np.sum(s)
-
-        # Calculate VIP values
-        vip = np.sqrt(h * s / total_s).flatten()
-        return vip
+    def calculate_vip(self):
+        # 拟合时已由 x_weights_、x_scores_ 和 y_loadings_ 算好，不再重新标准化 X
+        return self.pls.vip_
 
     def plot_results(self, y_true, y_pred, title='Prediction vs Reference'):
         plt.scatter(y_true, y_pred, color='red')
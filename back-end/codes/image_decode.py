@@ -0,0 +1,144 @@
+import struct
+
+import numpy as np
+import cv2
+
+# 降采样解码：JPEG 在 DCT 阶段直接缩小，其他格式解码后缩小
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# 降采样后短边至少保留的像素数，保证四角和中心区域仍有足够的像素求平均
+MIN_DECODE_SIDE = 500
+
+# 默认的像素上限（约 40MP），超过的图片在解码前就拒绝
+MAX_IMAGE_PIXELS = 40_000_000
+
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def read_image_size(data):
+    """只读取文件头得到 (宽, 高)，支持 PNG 和 JPEG，无法识别时返回 None"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        width, height = struct.unpack('>II', data[16:24])
+        return width, height
+
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 4 <= len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker == 0xFF:
+                # 填充字节
+                i += 1
+                continue
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                i += 2
+                continue
+            if marker in _JPEG_SOF_MARKERS:
+                if i + 9 > len(data):
+                    return None
+                height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                return width, height
+            length = struct.unpack('>H', data[i + 2:i + 4])[0]
+            i += 2 + length
+    return None
+
+
+def choose_reduction(width, height, min_side=MIN_DECODE_SIDE):
+    """选择最大的缩小倍数，使缩小后的短边不小于 min_side"""
+    short_side = min(width, height)
+    for factor in (8, 4, 2):
+        if short_side // factor >= min_side:
+            return factor
+    return 1
+
+
+def decode_image(data, reduce=True, min_side=MIN_DECODE_SIDE, max_pixels=MAX_IMAGE_PIXELS):
+    """从内存中的字节解码图像，返回 (图像, 缩小倍数)，无法解码时图像为 None
+
+    先读文件头：超过像素上限直接抛出 ImageTooLarge，不做完整解码；
+    reduce=True 时按尺寸选择 IMREAD_REDUCED_COLOR_2/4/8，手机拍的大图只解码到几百像素。
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if buf.size == 0:
+        return None, 1
+
+    size = read_image_size(data)
+    factor = 1
+    if size is not None:
+        width, height = size
+        if max_pixels and width * height > max_pixels:
+            raise ImageTooLarge(f'{width}x{height} 超过像素上限 {max_pixels}')
+        if reduce:
+            factor = choose_reduction(width, height, min_side)
+
+    img = cv2.imdecode(buf, REDUCED_FLAGS[factor])
+    if img is not None and size is None and max_pixels and img.shape[0] * img.shape[1] > max_pixels:
+        raise ImageTooLarge(f'{img.shape[1]}x{img.shape[0]} 超过像素上限 {max_pixels}')
+    return img, factor
+
+
+def scale_box(box_coords, factor):
+    """把降采样图像上的方框坐标换算回原图坐标"""
+    return tuple(int(v) * factor for v in box_coords)
+
+
+if __name__ == '__main__':
+    # 检查降采样解码提取的 RGB 与原分辨率的差异：
+    # 1) 对 Data/ 和 newData/ 下的每张图片按默认策略解码，并强制 2/4/8 倍缩小各比较一次（仅供参考）；
+    # 2) 把每张图片放大到手机照片的尺寸（4000 像素）并编码为 JPEG，检查 DCT 缩放解码的误差。
+    # 默认策略（auto、jpeg-auto）超出容差时返回非零退出码。
+    import argparse
+    import glob
+    import sys
+    from rgb_extract import white_balanced_center_mean
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tolerance', type=float, default=1.5, help='允许的 RGB 最大偏差')
+    parser.add_argument('--simulate-size', type=int, default=4000, help='模拟手机照片的长边像素，0 表示不模拟')
+    args = parser.parse_args()
+
+    image_paths = sorted(glob.glob('../Data/**/*.png', recursive=True) + glob.glob('../newData/**/*.png', recursive=True))
+
+    def rgb_of(img):
+        return white_balanced_center_mean(img)[0]
+
+    worst = {}
+    for path in image_paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        full = rgb_of(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR))
+
+        img, factor = decode_image(data)
+        worst.setdefault('auto', []).append(np.abs(rgb_of(img) - full).max())
+        for factor in (2, 4, 8):
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), REDUCED_FLAGS[factor])
+            worst.setdefault(f'x{factor}', []).append(np.abs(rgb_of(img) - full).max())
+
+        if args.simulate_size:
+            src = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            scale = args.simulate_size / max(src.shape[:2])
+            big = cv2.resize(src, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+            jpeg = cv2.imencode('.jpg', big, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes()
+            full = rgb_of(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR))
+            img, factor = decode_image(jpeg)
+            worst.setdefault('jpeg-auto', []).append(np.abs(rgb_of(img) - full).max())
+
+    print(f'共 {len(image_paths)} 张图片，容差 {args.tolerance}')
+    for name, errors in worst.items():
+        errors = np.array(errors)
+        print(f'{name:>10}: 最大偏差 {errors.max():.3f}，平均 {errors.mean():.3f}，'
+              f'超出容差 {(errors > args.tolerance).sum()} 张')
+
+    failed = any((np.array(worst[name]) > args.tolerance).any() for name in ('auto', 'jpeg-auto') if name in worst)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,95 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# 直方图的桶上限（毫秒）
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Histogram:
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms):
+        for i, bound in enumerate(self.buckets_ms):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum_ms += ms
+
+
+class Metrics:
+    """进程内的简单指标：各阶段耗时直方图和带标签的计数器，以 Prometheus 文本格式导出"""
+
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets_ms)
+            histogram.observe(seconds * 1000)
+
+    def inc(self, name, label_name, label, amount=1):
+        with self._lock:
+            _, counter = self._counters.setdefault(name, (label_name, {}))
+            counter[label] = counter.get(label, 0) + amount
+
+    def render(self, gauges=None):
+        """导出为 Prometheus 文本格式；gauges 为 {名称: 数值}，用于附带缓存、进程池等状态"""
+        lines = []
+        with self._lock:
+            lines.append('# TYPE stage_duration_ms histogram')
+            for stage in sorted(self._histograms):
+                histogram = self._histograms[stage]
+                cumulative = 0
+                for bound, count in zip(histogram.buckets_ms, histogram.counts):
+                    cumulative += count
+                    lines.append(f'stage_duration_ms_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'stage_duration_ms_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'stage_duration_ms_sum{{stage="{stage}"}} {histogram.sum_ms:.3f}')
+                lines.append(f'stage_duration_ms_count{{stage="{stage}"}} {histogram.count}')
+            for name in sorted(self._counters):
+                label_name, counter = self._counters[name]
+                lines.append(f'# TYPE {name}_total counter')
+                for label, value in sorted(counter.items()):
+                    lines.append(f'{name}_total{{{label_name}="{label}"}} {value}')
+        for name, value in sorted((gauges or {}).items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class StageTimer:
+    """记录一个请求里各阶段的耗时，同时写入全局直方图，最后生成 Server-Timing 头"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.timings = {}
+
+    def record(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        self.metrics.observe(stage, seconds)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def server_timing(self):
+        return ', '.join(f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in self.timings.items())
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from fused_pls import FusedPLSPredictor
+
+COLORS = ('blue', 'orange')
+
+# 一套模型由五个文件组成，目前仓库里有两种命名方式
+BUNDLE_LAYOUTS = (
+    # 例如 BluePurple-scaler_X_standard.pkl（标准训练脚本的输出）
+    {
+        'scaler_X': '{prefix}-scaler_X_standard.pkl',
+        'pls_absorbance_model': '{prefix}-trained_pls_absorbance_model.pkl',
+        'pls_concentration_model': '{prefix}-trained_pls_concentration_model.pkl',
+        'scaler_y_absorbance': '{prefix}-scaler_y_absorbance_standard.pkl',
+        'scaler_y_concentration': '{prefix}-scaler_y_concentration_standard.pkl',
+    },
+    # 例如 blue_scaler_X.pkl（PLS_blueAll.py / PLS_orangeAll.py 的输出）
+    {
+        'scaler_X': '{prefix}_scaler_X.pkl',
+        'pls_absorbance_model': '{prefix}_pls_absorbance_model.pkl',
+        'pls_concentration_model': '{prefix}_pls_concentration_model.pkl',
+        'scaler_y_absorbance': '{prefix}_scaler_y_absorbance.pkl',
+        'scaler_y_concentration': '{prefix}_scaler_y_concentration.pkl',
+    },
+)
+
+# 未配置 active.json 时使用的模型，与之前 app.py 写死的文件一致
+DEFAULT_ACTIVE = {'blue': 'BluePurple', 'orange': 'OrangePurple'}
+
+ACTIVE_FILE = 'active.json'
+
+
+def _layout_pattern(layout):
+    """把命名模板中的 scaler_X 文件名转换成用于识别前缀的正则"""
+    template = re.escape(layout['scaler_X']).replace(re.escape('{prefix}'), '(?P<prefix>.+)')
+    return re.compile('^' + template + '$')
+
+
+def _color_of(name, directory):
+    """根据前缀或所在目录判断是哪种颜色的模型"""
+    lowered = name.lower()
+    for color in COLORS:
+        if lowered.startswith(color):
+            return color
+    for part in reversed(directory.replace('\\', '/').split('/')):
+        if part in COLORS:
+            return part
+    return None
+
+
+class ModelSet:
+    """一次加载得到的全部模型（只读），请求处理期间持有同一个对象，换模型时整体替换"""
+
+    def __init__(self, predictors, versions):
+        self.predictors = predictors
+        self.versions = versions
+        self.version = ';'.join(f'{color}={versions[color]}' for color in sorted(versions))
+        self.loaded_at = time.time()
+
+    @staticmethod
+    def classify(X):
+        """按 Red>Blue 判断整批 RGB 是甲基橙（orange）还是亚甲基蓝（blue），返回颜色类型数组"""
+        X = np.asarray(X, dtype=np.float64)
+        return np.where(X[:, 0] > X[:, 2], 'orange', 'blue')
+
+    def predict_batch(self, X, color_types=None):
+        """把整批 RGB 按颜色分成橙色和蓝色两组，每组只调用一次模型，再按原顺序放回
+
+        color_types 为 classify(X) 的结果，为 None 时在这里判断。
+        返回 (颜色类型, 吸光度, 浓度) 三个长度为 n 的数组，负值修正为 0
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if color_types is None:
+            color_types = self.classify(X)
+        is_orange = color_types == 'orange'
+
+        absorbance = np.zeros(len(X))
+        concentration = np.zeros(len(X))
+        for color_type, mask in (('orange', is_orange), ('blue', ~is_orange)):
+            if mask.any():
+                absorbance[mask], concentration[mask] = self.predictors[color_type].predict(X[mask])
+        return color_types, absorbance, concentration
+
+    def check_domain_batch(self, X, color_types=None):
+        """与 predict_batch 相同的分组方式，返回 (T², Q, 是否在适用域内)
+
+        模型没有保存适用域的样本，T² 和 Q 为 NaN，是否在适用域内为 None
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if color_types is None:
+            color_types = self.classify(X)
+        is_orange = color_types == 'orange'
+        t2 = np.full(len(X), np.nan)
+        q = np.full(len(X), np.nan)
+        in_domain = np.full(len(X), None, dtype=object)
+        for color_type, mask in (('orange', is_orange), ('blue', ~is_orange)):
+            if mask.any() and self.predictors[color_type].domain is not None:
+                t2[mask], q[mask], inside = self.predictors[color_type].check_domain(X[mask])
+                in_domain[mask] = inside
+        return t2, q, in_domain
+
+
+class ModelRegistry:
+    """基于目录的模型注册表：按需加载，监视文件变化或通过 reload() 原子地切换模型
+
+    模型目录可以是扁平的（模型文件直接放在根目录下，和部署时一样），
+    也可以按颜色分子目录（back-end/model/blue、back-end/model/orange），
+    颜色目录下再建子目录存放不同版本，例如 model/blue/2024-11-18/BluePurple-*.pkl，
+    此时版本名为 2024-11-18/BluePurple。根目录下的 active.json 指定每种颜色使用的版本。
+    """
+
+    def __init__(self, root, active=None):
+        self.root = root
+        self.active = active
+        self._snapshot = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def _scan_dirs(self):
+        """需要查找模型文件的目录：根目录、颜色目录及其下一级版本目录"""
+        dirs = [self.root]
+        for color in COLORS:
+            color_dir = os.path.join(self.root, color)
+            if os.path.isdir(color_dir):
+                dirs.append(color_dir)
+                dirs.extend(entry.path for entry in os.scandir(color_dir) if entry.is_dir())
+        return dirs
+
+    def discover(self):
+        """查找所有完整的模型集合，返回 {颜色: {版本名: {组件名: 文件路径}}}"""
+        bundles = {color: {} for color in COLORS}
+        for directory in self._scan_dirs():
+            filenames = set(name for name in os.listdir(directory) if name.endswith('.pkl'))
+            rel_dir = os.path.relpath(directory, self.root)
+            # 颜色目录本身不计入版本名，只有其下的版本子目录才计入
+            parts = [p for p in rel_dir.replace('\\', '/').split('/') if p not in ('.', '') + COLORS]
+            for layout in BUNDLE_LAYOUTS:
+                pattern = _layout_pattern(layout)
+                for filename in filenames:
+                    match = pattern.match(filename)
+                    if not match:
+                        continue
+                    prefix = match.group('prefix')
+                    files = {key: template.format(prefix=prefix) for key, template in layout.items()}
+                    if not all(name in filenames for name in files.values()):
+                        continue
+                    color = _color_of(prefix, rel_dir)
+                    if color is None:
+                        continue
+                    name = '/'.join(parts + [prefix])
+                    bundles[color][name] = {key: os.path.join(directory, f) for key, f in files.items()}
+        return bundles
+
+    def active_names(self):
+        """每种颜色当前启用的版本名，优先读取 active.json"""
+        active = dict(DEFAULT_ACTIVE)
+        active_path = os.path.join(self.root, ACTIVE_FILE)
+        if os.path.exists(active_path):
+            with open(active_path, encoding='utf-8') as f:
+                active.update(json.load(f))
+        if self.active:
+            active.update(self.active)
+        return active
+
+    def fingerprint(self):
+        """所有模型文件和 active.json 的 (路径, 修改时间, 大小)，用于判断目录是否有变化"""
+        entries = []
+        for directory in self._scan_dirs():
+            for entry in os.scandir(directory):
+                if entry.is_file() and (entry.name.endswith('.pkl') or entry.name == ACTIVE_FILE):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(entries))
+
+    def _load(self):
+        """从磁盘完整地构建一个新的 ModelSet，失败时抛出异常，不影响正在使用的模型"""
+        fingerprint = self.fingerprint()
+        bundles = self.discover()
+        active = self.active_names()
+
+        predictors = {}
+        versions = {}
+        for color in COLORS:
+            name = active[color]
+            if name not in bundles[color]:
+                raise FileNotFoundError(f'找不到 {color} 模型 {name}，可用的有: {sorted(bundles[color])}')
+            files = bundles[color][name]
+
+            digest = hashlib.sha1()
+            components = {}
+            for key in ('scaler_X', 'pls_absorbance_model', 'pls_concentration_model',
+                        'scaler_y_absorbance', 'scaler_y_concentration'):
+                with open(files[key], 'rb') as f:
+                    digest.update(f.read())
+                components[key] = joblib.load(files[key])
+
+            predictors[color] = FusedPLSPredictor(
+                components['scaler_X'], components['pls_absorbance_model'], components['pls_concentration_model'],
+                components['scaler_y_absorbance'], components['scaler_y_concentration'])
+            versions[color] = f'{name}@{digest.hexdigest()[:8]}'
+
+        return ModelSet(predictors, versions), fingerprint
+
+    def current(self):
+        """返回当前的 ModelSet，第一次调用时才加载"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot, self._fingerprint = self._load()
+                snapshot = self._snapshot
+        return snapshot
+
+    def reload(self):
+        """重新加载模型，构建成功后一次性替换；正在处理的请求继续使用旧的 ModelSet"""
+        with self._lock:
+            snapshot, fingerprint = self._load()
+            self._snapshot, self._fingerprint = snapshot, fingerprint
+        print("Models loaded:", snapshot.version)
+        return snapshot
+
+    def check_for_changes(self, previous=None):
+        """目录有变化且与上一次检查时一致（文件已写完）时重新加载，返回本次的指纹"""
+        fingerprint = self.fingerprint()
+        if self._snapshot is None:
+            # 还没有请求用到模型，保持按需加载
+            return fingerprint
+        if fingerprint != self._fingerprint and fingerprint == previous:
+            try:
+                self.reload()
+            except Exception as e:
+                # 新模型有问题时保留旧模型，等下一次变化再试
+                print("Model reload failed:", repr(e))
+                self._fingerprint = fingerprint
+        return fingerprint
+
+    def start_watching(self, interval=10.0):
+        """启动后台线程定期检查模型目录"""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            previous = None
+            while True:
+                time.sleep(interval)
+                try:
+                    previous = self.check_for_changes(previous)
+                except OSError as e:
+                    print("Model watch failed:", repr(e))
+
+        self._watcher = threading.Thread(target=watch, name='model-watcher', daemon=True)
+        self._watcher.start()
@@ -0,0 +1,110 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import cv2
+
+MIMETYPES = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg'}
+
+
+def draw_red_box(img, box_coords):
+    """在图像上画出中心区域的红色方框（原地修改）"""
+    center_x, center_y, center_width, center_height = box_coords
+    cv2.rectangle(img, (center_x, center_y), (center_x + center_width, center_y + center_height), (0, 0, 255), 2)
+    return img
+
+
+def draw_red_boxes(img, boxes):
+    """画出多个样本区域的红色方框，多于一个时在框的左上角标出序号（从 1 开始，与 regions 的顺序一致）"""
+    for i, box in enumerate(boxes):
+        draw_red_box(img, box)
+        if len(boxes) > 1:
+            x, y = box[0], box[1]
+            scale = max(0.5, min(img.shape[:2]) / 1000)
+            cv2.putText(img, str(i + 1), (x + 4, y + int(24 * scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                        scale, (0, 0, 255), max(1, int(2 * scale)))
+    return img
+
+
+def _normalize_boxes(box_coords):
+    """单个方框 (x, y, w, h) 或方框列表，统一成方框元组的元组"""
+    if len(box_coords) and np.isscalar(box_coords[0]):
+        box_coords = [box_coords]
+    return tuple(tuple(int(v) for v in box) for box in box_coords)
+
+
+class LazyOverlayStore:
+    """按需渲染带红框的处理后图像
+
+    上传时只记录原图字节和方框坐标（一个或多个方框），第一次请求处理后图像时才解码、画框、编码，
+    编码结果缓存起来供后续请求直接返回。原图和渲染结果共用一个按字节数限制的 LRU。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._sources = OrderedDict()  # name -> (原图字节, 方框坐标)
+        self._rendered = OrderedDict()  # name -> 编码后的字节
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.renders = 0
+
+    def _evict(self):
+        # 优先淘汰已渲染的结果（可以从原图重新生成），再淘汰原图
+        while self._bytes > self.max_bytes and (self._rendered or self._sources):
+            entries = self._rendered if self._rendered else self._sources
+            _, value = entries.popitem(last=False)
+            self._bytes -= len(value[0]) if isinstance(value, tuple) else len(value)
+
+    def register(self, name, data, box_coords):
+        """记录一张待渲染的图像，不做任何图像处理"""
+        with self._lock:
+            old = self._rendered.pop(name, None)
+            if old is not None:
+                self._bytes -= len(old)
+            old = self._sources.pop(name, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._sources[name] = (data, _normalize_boxes(box_coords))
+            self._bytes += len(data)
+            self._evict()
+
+    def ensure(self, name, data, box_coords):
+        """还没有记录（或已被淘汰）时重新记录，已有的只更新访问顺序；用于结果缓存命中时"""
+        with self._lock:
+            for entries in (self._rendered, self._sources):
+                if name in entries:
+                    entries.move_to_end(name)
+                    return
+        self.register(name, data, box_coords)
+
+    def render(self, name):
+        """返回 (编码后的字节, mimetype)，不认识的名字返回 None"""
+        mimetype = MIMETYPES.get(os.path.splitext(name)[1].lower(), 'image/png')
+        with self._lock:
+            rendered = self._rendered.get(name)
+            if rendered is not None:
+                self._rendered.move_to_end(name)
+                return rendered, mimetype
+            source = self._sources.get(name)
+            if source is None:
+                return None
+            self._sources.move_to_end(name)
+
+        data, boxes = source
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        ext = os.path.splitext(name)[1].lower() or '.png'
+        ok, encoded = cv2.imencode(ext, draw_red_boxes(img, boxes))
+        if not ok:
+            return None
+        rendered = encoded.tobytes()
+
+        with self._lock:
+            self.renders += 1
+            if name in self._sources and name not in self._rendered:
+                self._rendered[name] = rendered
+                self._bytes += len(rendered)
+                self._evict()
+        return rendered, mimetype
@@ -0,0 +1,182 @@
+"""Kennard–Stone 和 SPXY 样本划分，内存占用 O(n)
+
+对应 back-end/matlab/libPLS_1.98/ks.m。ks.m 先算出完整的 n×n 距离矩阵，
+这里只保留一个“每个样本到已选样本的最近距离”向量，每选入一个样本只更新它附近（用 KD 树查找）的样本，
+几十万个样本时也不会构造 n×n 矩阵。
+
+第一对样本（距离最远的两个样本）不需要两两比较全部样本：距离是两点之差的凸函数，
+最大值一定出现在凸包顶点之间，所以只在凸包顶点中两两比较；凸包不可用时退回分块的精确搜索。
+SPXY 的距离为 dx / max(dx) + dy / max(dy)（Galvão 等，2005），同样是凸函数，按 X 和 y 拼接后的凸包处理。
+"""
+import numbers
+
+import numpy as np
+
+# 分块搜索最远点对时每块的元素上限
+BLOCK_ELEMENTS = 1 << 22
+
+
+def _norms(diff):
+    return np.sqrt(np.einsum('...j,...j->...', diff, diff))
+
+
+def _hull_candidates(points):
+    """凸包顶点的索引，凸包不可用（没有 scipy、退化、维数过高）时返回全部样本"""
+    n, dim = points.shape
+    if dim == 1:
+        return np.unique([np.argmin(points[:, 0]), np.argmax(points[:, 0])])
+    if n <= dim + 1 or dim > 6:
+        return np.arange(n)
+    try:
+        from scipy.spatial import ConvexHull
+        return np.sort(ConvexHull(points).vertices)
+    except Exception:
+        return np.arange(n)
+
+
+def _farthest_pair(blocks, weights, candidates):
+    """在候选样本中找加权距离之和最大的一对，分块计算，不构造完整的距离矩阵"""
+    m = len(candidates)
+    step = max(1, BLOCK_ELEMENTS // max(m, 1))
+    best, best_pair = -1.0, (candidates[0], candidates[min(1, m - 1)])
+    for start in range(0, m, step):
+        rows = candidates[start:start + step]
+        d = np.zeros((len(rows), m))
+        for block, weight in zip(blocks, weights):
+            d += weight * _norms(block[rows][:, None, :] - block[candidates][None, :, :])
+        i, j = np.unravel_index(np.argmax(d), d.shape)
+        if d[i, j] > best:
+            best, best_pair = d[i, j], (rows[i], candidates[j])
+    return best_pair, best
+
+
+def _max_distance(block):
+    candidates = _hull_candidates(block)
+    return _farthest_pair([block], [1.0], candidates)[1]
+
+
+def _select(blocks, weights, n_select):
+    n = len(blocks[0])
+    n_select = n if n_select is None else max(0, min(n_select, n))
+    if n_select == 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = _hull_candidates(np.hstack(blocks))
+    first, second = _farthest_pair(blocks, weights, candidates)[0]
+    if first == second:
+        # 全部样本重合时最远点对退化为同一个样本，第二个样本任取另一个
+        second = 1 if first == 0 else 0
+    if n_select == 1:
+        return np.array([first], dtype=np.int64)
+
+    # 加权后拼接空间中的欧氏距离不超过加权距离之和，用 KD 树按它查找可能需要更新的样本；
+    # 样本按 KD 树叶子的顺序重新排列，空间上相邻的样本在数组中也相邻
+    scaled = np.hstack([weight * block for block, weight in zip(blocks, weights)])
+    try:
+        from scipy.spatial import cKDTree
+        perm = cKDTree(scaled).indices
+        tree = cKDTree(scaled[perm])
+    except ImportError:
+        perm = np.arange(n)
+        tree = None
+    position = np.empty(n, dtype=np.int64)
+    position[perm] = np.arange(n)
+    scaled = scaled[perm]
+    blocks = [block[perm] for block in blocks]
+
+    # 最近距离向量按块记录最大值，找最远样本时不必每次扫描整个向量
+    size = max(64, int(np.sqrt(n)))
+    n_blocks = -(-n // size)
+    min_distance = np.full(n_blocks * size, -np.inf)
+    min_distance[:n] = np.inf
+    by_block = min_distance.reshape(n_blocks, size)
+    block_max = by_block.max(axis=1)
+
+    def refresh(ids):
+        touched = np.unique(ids // size)
+        block_max[touched] = by_block[touched].max(axis=1)
+
+    def update(index, radius):
+        if tree is None or not np.isfinite(radius):
+            ids = np.arange(n)
+        else:
+            ids = np.asarray(tree.query_ball_point(scaled[index], radius), dtype=np.int64)
+            if len(ids) == 0:
+                return
+        d = np.zeros(len(ids))
+        for block, weight in zip(blocks, weights):
+            d += weight * _norms(block[ids] - block[index])
+        min_distance[ids] = np.minimum(min_distance[ids], d)
+        refresh(ids)
+
+    def take(index):
+        min_distance[index] = -np.inf
+        refresh(np.array([index]))
+
+    order = np.empty(n_select, dtype=np.int64)
+    first, second = position[first], position[second]
+    order[:2] = first, second
+    update(first, np.inf)
+    update(second, np.inf)
+    take(first)
+    take(second)
+    for k in range(2, n_select):
+        # 选离已选样本最远的样本（最近距离为 radius），与它的距离不小于 radius 的样本最近距离不会变小，
+        # 所以只需要更新以它为中心、半径为 radius 的球内的样本
+        b = int(np.argmax(block_max))
+        index = b * size + int(np.argmax(by_block[b]))
+        radius = min_distance[index]
+        order[k] = index
+        take(index)
+        update(index, radius)
+    return perm[order]
+
+
+def kennard_stone(X, n_select=None):
+    """按 Kennard–Stone 顺序返回样本索引（前 n_select 个，默认全部），除距离相等时的先后外与 ks.m 的 Rank 相同"""
+    X = np.asarray(X, dtype=np.float64)
+    if len(X) < 2:
+        return np.arange(len(X))[:n_select]
+    return _select([X], [1.0], n_select)
+
+
+def spxy(X, Y, n_select=None):
+    """按 SPXY 顺序返回样本索引，X 和 y 的距离各自除以最大距离后相加"""
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y.reshape(-1, 1)
+    if len(X) < 2:
+        return np.arange(len(X))[:n_select]
+    max_x = _max_distance(X)
+    max_y = _max_distance(Y)
+    weights = [1.0 / max_x if max_x > 0 else 0.0, 1.0 / max_y if max_y > 0 else 0.0]
+    return _select([X, Y], weights, n_select)
+
+
+def partition(X, Y=None, test_size=0.2, method='ks'):
+    """划分训练集和测试集，返回 (训练集索引, 测试集索引)
+
+    先被选中的样本覆盖了数据的边界和整个分布，作为训练集；剩下的作为测试集。
+    method 为 'ks'（只看 X）或 'spxy'（同时看 X 和 Y）。
+    test_size 为 [0, 1) 之间的小数（测试集比例，向上取整）或测试集样本数，训练集至少保留一个样本。
+    """
+    n = len(X)
+    if isinstance(test_size, numbers.Integral) and not isinstance(test_size, bool) and test_size >= 0:
+        n_test = int(test_size)
+    elif isinstance(test_size, numbers.Real) and 0 <= test_size < 1:
+        n_test = int(np.ceil(n * test_size))
+    else:
+        raise ValueError(f'test_size 应为 [0, 1) 之间的小数或样本数: {test_size!r}')
+    if n_test >= n:
+        raise ValueError(f'test_size={test_size!r} 时 {n} 个样本中测试集有 {n_test} 个，训练集没有样本')
+    n_train = n - n_test
+    if method == 'ks':
+        train = kennard_stone(X, n_train)
+    elif method == 'spxy':
+        if Y is None:
+            raise ValueError('SPXY 需要同时提供 Y')
+        train = spxy(X, Y, n_train)
+    else:
+        raise ValueError(f'未知的划分方法: {method}')
+    test = np.setdiff1d(np.arange(n), train)
+    return train, test
@@ -0,0 +1,103 @@
+import time
+
+import numpy as np
+import cv2
+
+from region_detect import detect_regions, extract_regions
+from rgb_extract import white_balanced_center_mean
+from image_decode import decode_image, scale_box, ImageTooLarge, MAX_IMAGE_PIXELS
+
+
+def extract_rgb(img):
+    # 兼容旧的调用方式：传入路径时从磁盘读取
+    if isinstance(img, str):
+        img = cv2.imread(img)
+
+    # 四角白平衡 + 中心区域均值，基于直方图计算，不产生整幅图像的浮点副本
+    avg_colors_center, box_coords = white_balanced_center_mean(img)
+
+    # 返回校正后的中心RGB值和中心区域的坐标
+    return {'red': avg_colors_center[2], 'green': avg_colors_center[1], 'blue': avg_colors_center[0]}, box_coords
+
+
+def analyze_image(data, models, reduce=True, max_pixels=MAX_IMAGE_PIXELS):
+    """单张图片的计算部分：解码、检测样本区域、白平衡提取RGB、判断颜色、预测、适用域检查
+
+    不依赖 Flask，既可以在请求线程中直接调用，也可以放到工作进程中执行。
+    一张照片中可以有多个样本（孔板），regions 按行、列顺序给出每个区域的结果，
+    顶层的 rgb、absorbance 等字段是第一个区域的结果（单个样本时与之前相同）。
+    返回结果字典（timings 为各阶段耗时，单位秒），出错时返回 {'error': ...}。
+    """
+    timings = {}
+
+    # 只解码一次，后续白平衡和预测共用同一个数组；大图直接解码为缩小后的尺寸
+    start = time.perf_counter()
+    try:
+        img, factor = decode_image(data, reduce=reduce, max_pixels=max_pixels)
+    except ImageTooLarge as e:
+        print("Image too large:", e)
+        return {'error': 'Image too large', 'timings': timings}
+    timings['decode'] = time.perf_counter() - start
+    if img is None:
+        return {'error': 'Invalid image', 'timings': timings}
+
+    # 检测样本区域
+    start = time.perf_counter()
+    detection = detect_regions(img)
+    timings['detect'] = time.perf_counter() - start
+
+    # 提取每个区域白平衡后的RGB值（区域坐标换算回原图坐标，用于画框）；
+    # 找不到区域时与之前一样使用四角白色和中心区域
+    start = time.perf_counter()
+    found, detected = extract_regions(img, detection=detection)
+    timings['white_balance'] = time.perf_counter() - start
+
+    # 识别颜色类型：Red>Blue 为甲基橙，否则为亚甲基蓝
+    start = time.perf_counter()
+    X = np.array([[rgb['red'], rgb['green'], rgb['blue']] for rgb, _ in found])
+    color_types = models.classify(X)
+    timings['color'] = time.perf_counter() - start
+
+    # 全部区域一起预测，每种颜色的模型只调用一次
+    start = time.perf_counter()
+    _, absorbances, concentrations = models.predict_batch(X, color_types)
+    timings['predict'] = time.perf_counter() - start
+
+    # 适用域检查：T² 或 Q 超出训练时的控制限说明照片的颜色不在模型覆盖的范围内，预测值不可信
+    start = time.perf_counter()
+    t2s, qs, in_domains = models.check_domain_batch(X, color_types)
+    timings['domain'] = time.perf_counter() - start
+
+    regions = []
+    for (rgb, box), color_type, absorbance, concentration, t2, q, in_domain in zip(
+            found, color_types, absorbances, concentrations, t2s, qs, in_domains):
+        color_type = str(color_type)
+        regions.append({
+            'rgb': rgb,
+            'box': scale_box(box, factor),
+            'color_type': color_type,
+            'absorbance': float(absorbance),
+            'concentration': float(concentration),
+            't2': None if np.isnan(t2) else float(t2),
+            'q': None if np.isnan(q) else float(q),
+            'in_domain': None if in_domain is None else bool(in_domain),
+            'model_version': models.versions[color_type]
+        })
+
+    first = regions[0]
+    return {
+        'timings': timings,
+        'rgb': first['rgb'],
+        'box_coords': first['box'],
+        'color_type': first['color_type'],
+        'absorbance': first['absorbance'],
+        'concentration': first['concentration'],
+        't2': first['t2'],
+        'q': first['q'],
+        'in_domain': first['in_domain'],
+        'model_version': first['model_version'],
+        'regions': regions,
+        'detected': detected,
+        # 整套模型的版本，调用方据此生成缓存键，不放进响应
+        'models_version': models.version
+    }
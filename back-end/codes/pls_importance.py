@@ -0,0 +1,131 @@
+"""PLS 模型的变量重要性：VIP、选择性比（selectivity ratio）和标准化回归系数
+
+都由拟合后保存的权重、得分和载荷得到，拟合时算一次并作为属性保存在模型里（随 joblib.dump 一起保存）：
+- VIP 只用到 x_weights_、x_scores_ 每列的平方和和 y_loadings_，O(n·A)，不构造 n×n 的中间矩阵；
+- 选择性比只需要标准化后 X 的 X'X（p×p），按块累加，不复制整个 X；
+- 系数重要性为标准化空间中回归系数的绝对值占比。
+
+    pls.fit(X_train_scaled, y_train_scaled)
+    attach_importance(pls, X_train_scaled)     # pls.vip_, pls.selectivity_ratio_, pls.coef_importance_
+"""
+import numpy as np
+import pandas as pd
+
+# 计算 X'X 时每块的行数
+CHUNK_ROWS = 100000
+
+
+def vip(x_weights, x_scores, y_loadings):
+    """VIP_j = sqrt(p · Σ_a SS_a (w_ja / ||w_a||)² / Σ_a SS_a)，SS_a = ||t_a||² · ||q_a||²，返回 (p,)"""
+    x_weights = np.asarray(x_weights, dtype=np.float64)
+    n_features = x_weights.shape[0]
+    ss = np.einsum('na,na->a', x_scores, x_scores) * np.einsum('ma,ma->a', y_loadings, y_loadings)
+    total = ss.sum()
+    if total == 0:
+        return np.zeros(n_features)
+    w2 = (x_weights / np.linalg.norm(x_weights, axis=0)) ** 2
+    return np.sqrt(n_features * (w2 @ ss) / total)
+
+
+def selectivity_ratio(coef, cxx):
+    """按目标投影（target projection）分解 X：每个变量被 X·b 方向解释的方差 / 残差方差
+
+    coef: 标准化空间的回归系数 (p, m)；cxx: 标准化后 X 的 X'X (p, p)。返回 (p, m)
+    """
+    coef = np.asarray(coef, dtype=np.float64).reshape(cxx.shape[0], -1)
+    projected = cxx @ coef                            # X'·t_TP，t_TP = X·b
+    tt = np.einsum('pm,pm->m', coef, projected)       # t_TP'·t_TP
+    with np.errstate(divide='ignore', invalid='ignore'):
+        explained = np.where(tt > 0, projected ** 2 / tt, 0.0)
+    residual = np.diag(cxx)[:, None] - explained
+    # 完全被解释的变量残差为 0（只差舍入误差），选择性比记为 inf
+    residual[residual <= np.diag(cxx)[:, None] * 1e-12] = 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(residual > 0, explained / residual, np.inf)
+
+
+def coef_importance(coef):
+    """标准化回归系数的绝对值占比，每个目标各自归一化，返回 (p, m)"""
+    weight = np.abs(np.asarray(coef, dtype=np.float64))
+    weight = weight.reshape(weight.shape[0], -1)
+    total = weight.sum(axis=0)
+    return np.divide(weight, total, out=np.zeros_like(weight), where=total > 0)
+
+
+def _scaled_cross_product(pls, X):
+    """按模型自己的中心化和缩放处理 X 后的 X'X，按块累加"""
+    X = np.asarray(X, dtype=np.float64)
+    cxx = np.zeros((X.shape[1], X.shape[1]))
+    for start in range(0, len(X), CHUNK_ROWS):
+        block = (X[start:start + CHUNK_ROWS] - pls._x_mean) / pls._x_std
+        cxx += block.T @ block
+    return cxx
+
+
+def attach_importance(pls, X):
+    """在拟合好的 sklearn PLSRegression 上保存 vip_、selectivity_ratio_、coef_importance_，返回 pls
+
+    X 为传给 fit 的训练数据。单目标时后两者的形状为 (p,)，多目标时为 (p, m)。
+    """
+    # sklearn 内部标准化空间中的回归系数
+    coef = pls.x_rotations_ @ pls.y_loadings_.T
+    ratio = selectivity_ratio(coef, _scaled_cross_product(pls, X))
+    importance = coef_importance(coef)
+    squeeze = coef.shape[1] == 1
+    pls.vip_ = vip(pls.x_weights_, pls.x_scores_, pls.y_loadings_)
+    pls.selectivity_ratio_ = ratio[:, 0] if squeeze else ratio
+    pls.coef_importance_ = importance[:, 0] if squeeze else importance
+    return pls
+
+
+def importance_table(pls, feature_names=('Red', 'Green', 'Blue')):
+    """把保存的重要性整理成表格，每个变量一行；旧模型没有保存时报错"""
+    if not hasattr(pls, 'vip_'):
+        raise ValueError('模型没有保存变量重要性，请重新训练或先调用 attach_importance')
+    table = pd.DataFrame({'VIP': pls.vip_}, index=list(feature_names))
+    for name, values in (('SR', pls.selectivity_ratio_), ('CoefImportance', pls.coef_importance_)):
+        values = np.asarray(values)
+        if values.ndim == 1:
+            table[name] = values
+        else:
+            for j in range(values.shape[1]):
+                table[f'{name}_y{j}'] = values[:, j]
+    return table
+
+
+if __name__ == '__main__':
+    # 与逐样本、构造完整矩阵的直接算法对照，并在放大的数据上看耗时和内存
+    import resource
+    import time
+
+    from sklearn.cross_decomposition import PLSRegression
+    from sklearn.preprocessing import StandardScaler
+
+    from dataset_store import load
+
+    data = load('all_blue', columns=['Red', 'Green', 'Blue', 'Absorbance', 'Concentration'])
+    X = StandardScaler().fit_transform(data[['Red', 'Green', 'Blue']].values)
+    Y = data[['Absorbance', 'Concentration']].values
+
+    for y in (Y[:, 0], Y):
+        pls = attach_importance(PLSRegression(n_components=3).fit(X, y), X)
+        t, w, q = pls.x_scores_, pls.x_weights_, pls.y_loadings_
+        ss = np.array([(t[:, a] @ t[:, a]) * (q[:, a] @ q[:, a]) for a in range(w.shape[1])])
+        expected_vip = np.sqrt(w.shape[0] * ((w / np.linalg.norm(w, axis=0)) ** 2 @ ss) / ss.sum())
+        Xs = (X - pls._x_mean) / pls._x_std
+        b = (pls.x_rotations_ @ pls.y_loadings_.T)[:, 0]
+        t_tp = Xs @ b
+        explained = np.outer(t_tp, Xs.T @ t_tp / (t_tp @ t_tp))
+        expected_sr = (explained ** 2).sum(axis=0) / ((Xs - explained) ** 2).sum(axis=0)
+        sr = pls.selectivity_ratio_ if pls.selectivity_ratio_.ndim == 1 else pls.selectivity_ratio_[:, 0]
+        print(f'目标数 {np.ndim(y)}: VIP 最大差异 {np.max(np.abs(pls.vip_ - expected_vip)):.2e}，'
+              f'SR 最大相对差异 {np.max(np.abs(sr / expected_sr - 1)):.2e}')
+        print(importance_table(pls).to_string(float_format=lambda v: f'{v:.4f}'))
+
+    big = np.repeat(X, 5000, axis=0) + np.random.default_rng(0).normal(0, 0.01, (len(X) * 5000, 3))
+    pls = PLSRegression(n_components=3).fit(big, np.repeat(Y[:, 0], 5000))
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    attach_importance(pls, big)
+    print(f'{len(big)} 个样本: 耗时 {time.perf_counter() - start:.3f} 秒，'
+          f'峰值内存增加 {(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024:.1f} MB')
@@ -0,0 +1,199 @@
+"""在一张照片中找出白色参考和一个或多个有颜色的样本区域（比色皿、孔板的孔）
+
+在缩小到 DETECT_PIXELS 以内的图像上完成检测：先用最亮的低饱和像素估计白色，白平衡后
+按每个像素的色度（最大通道 − 最小通道）做阈值分割（Otsu，且不低于 MIN_CHROMA），
+开闭运算去掉噪点后用连通域得到各个样本区域，再按行、列排序。每个区域取外接框的中心一半
+（与 center_box 相同的规则，避开边缘和弯月面），在原图上按直方图精确计算白平衡后的均值。
+
+与训练数据的拍法保持一致：没有检测到区域，或只检测到一个且位于中心区域内的区域时，
+仍然使用四角白色 + 中心区域（与 extract_rgb 逐位一致）；只有多个样本或样本明显偏离中心时才用检测结果。
+四角都是背景时白色参考仍取四角的平均，四角被样本占据时才改用其余背景像素。
+
+    regions, detected = extract_regions(cv2.imread('plate.jpg'))   # [(rgb, (x, y, w, h)), ...]
+"""
+import cv2
+import numpy as np
+
+from rgb_extract import (IDEAL_WHITE, STRIP_PIXELS, box_mean, center_box, corner_white_average, shrink,
+                         white_balanced_center_mean)
+
+# 检测用的图像像素上限
+DETECT_PIXELS = 256 * 256
+# 色度阈值的下限：白纸、阴影的色度一般在 10 以下
+MIN_CHROMA = 25
+# 区域面积下限（占缩小后图像的比例）和占外接框的比例下限（去掉细长的反光、边框）
+MIN_REGION_FRACTION = 0.003
+MIN_FILL_RATIO = 0.4
+# 多个区域时，面积不到最大区域这个比例的视为反光或杂色（同一块孔板上的孔大小相近）
+MIN_RELATIVE_AREA = 0.25
+# 只有一个区域时，面积至少占图像的这个比例才认为是样本，否则按拍法不规范的杂点处理
+MIN_SINGLE_FRACTION = 0.02
+# 一张照片最多返回的区域数（96 孔板）
+MAX_REGIONS = 96
+
+
+def _channel_extremes(img):
+    """逐像素的最小和最大通道值，用 OpenCV 按通道比较，比 numpy 沿最后一维归约快得多"""
+    b, g, r = cv2.split(img)
+    return cv2.min(cv2.min(b, g), r), cv2.max(cv2.max(b, g), r)
+
+
+def _estimate_white(small, darkest, background=None):
+    """最亮的一半背景像素（按最小通道排序）的均值作为白色参考，通道顺序与输入一致"""
+    if background is None or not background.any():
+        background = np.ones(darkest.shape, dtype=bool)
+    bright = background & (darkest >= np.median(darkest[background]))
+    return np.maximum(np.array(cv2.mean(small, mask=bright.astype(np.uint8))[:3]), 1.0)
+
+
+def _reading_order(boxes):
+    """按行、列排序：中心的纵坐标相差不到半个区域高度的算同一行，行内按横坐标排序"""
+    if not boxes:
+        return boxes
+    boxes = sorted(boxes, key=lambda b: b[1] + b[3] / 2)
+    tolerance = np.median([b[3] for b in boxes]) / 2
+    rows = [[boxes[0]]]
+    for box in boxes[1:]:
+        previous = rows[-1][-1]
+        if (box[1] + box[3] / 2) - (previous[1] + previous[3] / 2) > tolerance:
+            rows.append([])
+        rows[-1].append(box)
+    return [box for row in rows for box in sorted(row, key=lambda b: b[0])]
+
+
+def detect_regions(img):
+    """在 BGR 图像上检测样本区域，返回 (区域框列表, 白色参考)
+
+    区域框为原图坐标的 (x, y, w, h)（已取外接框的中心一半），按行、列排序；白色参考为原图通道顺序。
+    """
+    height, width = img.shape[:2]
+    small = shrink(img, DETECT_PIXELS)
+    scale_y, scale_x = height / small.shape[0], width / small.shape[1]
+
+    darkest, _ = _channel_extremes(small)
+    white = _estimate_white(small, darkest)
+    lut = np.stack([np.clip(np.arange(256) * IDEAL_WHITE / white[c], 0, 255) for c in range(3)], axis=-1)
+    balanced = cv2.LUT(small, np.round(lut).astype(np.uint8).reshape(256, 1, 3))
+    low, high = _channel_extremes(balanced)
+    chroma = cv2.blur(cv2.subtract(high, low), (3, 3))
+
+    otsu, _ = cv2.threshold(chroma, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = (chroma > max(otsu, MIN_CHROMA)).astype(np.uint8)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    min_area = max(16, MIN_REGION_FRACTION * mask.size)
+    components = []
+    for x, y, w, h, area in stats[1:count]:
+        # 碰到图像边缘的多半是容器壁、桌面或被裁掉一半的孔
+        touches_border = x == 0 or y == 0 or x + w == mask.shape[1] or y + h == mask.shape[0]
+        if area < min_area or area < MIN_FILL_RATIO * w * h or touches_border:
+            continue
+        components.append((area, x, y, w, h))
+    components.sort(reverse=True)
+    if components:
+        largest = components[0][0]
+        components = [c for c in components if c[0] >= MIN_RELATIVE_AREA * largest][:MAX_REGIONS]
+        if len(components) == 1 and largest < MIN_SINGLE_FRACTION * mask.size:
+            components = []
+
+    boxes = []
+    for _, x, y, w, h in components:
+        dx, dy, dw, dh = center_box(h, w)
+        boxes.append((int((x + dx) * scale_x), int((y + dy) * scale_y),
+                      max(1, int(dw * scale_x)), max(1, int(dh * scale_y))))
+
+    # 四角都是背景时与 extract_rgb 一样取四角的平均；否则用样本区域（略微膨胀）以外的像素估计
+    background = cv2.dilate(mask, kernel, iterations=2) == 0
+    ch, cw = max(1, small.shape[0] // 8), max(1, small.shape[1] // 8)
+    corners = (background[:ch, :cw], background[:ch, -cw:], background[-ch:, :cw], background[-ch:, -cw:])
+    if all(corner.all() for corner in corners):
+        white = corner_white_average(img)
+    elif boxes:
+        white = _estimate_white(small, darkest, background)
+    return _reading_order(boxes), white
+
+
+def _in_center(box, height, width):
+    """区域中心是否落在 center_box 内"""
+    x, y, w, h = box
+    cx, cy, cw, ch = center_box(height, width)
+    return cx <= x + w / 2 <= cx + cw and cy <= y + h / 2 <= cy + ch
+
+
+def extract_regions(img, truncate=True, strip_pixels=STRIP_PIXELS, detection=None):
+    """返回 ([(RGB 字典, 区域框), ...], 是否使用了检测结果)，RGB 字典与 extract_rgb 的格式相同
+
+    detection 为已经算好的 detect_regions(img) 结果（分阶段计时时传入），为 None 时在这里检测。
+    """
+    height, width = img.shape[:2]
+    boxes, white = detect_regions(img) if detection is None else detection
+
+    if len(boxes) == 0 or (len(boxes) == 1 and _in_center(boxes[0], height, width)):
+        means, box = white_balanced_center_mean(img, truncate, strip_pixels)
+        return [({'red': means[2], 'green': means[1], 'blue': means[0]}, box)], False
+
+    correction_factor = IDEAL_WHITE / white
+    regions = []
+    for box in boxes:
+        means = box_mean(img, box, correction_factor, truncate, strip_pixels)
+        regions.append(({'red': means[2], 'green': means[1], 'blue': means[0]}, box))
+    return regions, True
+
+
+if __name__ == '__main__':
+    # 现有单孔照片应回退到中心区域；把它们拼成 3×4 的“孔板”检查能否找回 12 个区域，并测耗时
+    import glob
+    import time
+
+    from pipeline import extract_rgb
+
+    paths = sorted(glob.glob('../Data/**/*.png', recursive=True))
+    images = [cv2.imread(p) for p in paths]
+    fallback = 0
+    max_error = 0.0
+    for image in images:
+        regions, detected = extract_regions(image)
+        if not detected:
+            fallback += 1
+            rgb, _ = extract_rgb(image)
+            max_error = max(max_error, *(abs(regions[0][0][c] - rgb[c]) for c in rgb))
+    print(f'{len(images)} 张单孔照片，{fallback} 张使用中心区域（与 extract_rgb 最大差异 {max_error:.2e}）')
+
+    # 颜色较深的 12 张，缩放到相同大小后放在白纸上排成 3 行 4 列
+    depth = [255 - min(extract_rgb(image)[0].values()) for image in images]
+    wells = [images[i] for i in np.argsort(depth)[::-1][:12]]
+    cell = 300
+    plate = np.full((3 * cell + 100, 4 * cell + 100, 3), 245, dtype=np.uint8)
+    expected = []
+    for k, well in enumerate(wells):
+        row, col = divmod(k, 4)
+        y, x = 50 + row * cell + 40, 50 + col * cell + 40
+        patch = cv2.resize(well, (cell - 80, cell - 80), interpolation=cv2.INTER_AREA)
+        circle = np.zeros(patch.shape[:2], dtype=np.uint8)
+        cv2.circle(circle, ((cell - 80) // 2, (cell - 80) // 2), (cell - 80) // 2 - 4, 1, -1)
+        plate[y:y + cell - 80, x:x + cell - 80][circle > 0] = patch[circle > 0]
+        expected.append((x + (cell - 80) // 2, y + (cell - 80) // 2))
+    big_plate = cv2.resize(plate, (4000, 3000), interpolation=cv2.INTER_LINEAR)
+
+    regions, detected = extract_regions(plate)
+    centers = [(x + w / 2, y + h / 2) for _, (x, y, w, h) in regions]
+    matched = sum(any(abs(cx - ex) < cell / 4 and abs(cy - ey) < cell / 4 for cx, cy in centers)
+                  for ex, ey in expected)
+    in_order = all(abs(cx - ex) < cell / 4 and abs(cy - ey) < cell / 4
+                   for (cx, cy), (ex, ey) in zip(centers, expected))
+    print(f'孔板：检测到 {len(regions)} 个区域，{matched}/12 个孔匹配，顺序{"正确" if in_order else "不正确"}')
+
+    for label, image in (('单孔照片', images[0]), ('孔板 1300×1000', plate), ('孔板 4000×3000', big_plate)):
+        repeats = 200 if image.size < 10 ** 6 else 20
+        start = time.perf_counter()
+        for _ in range(repeats):
+            detect_regions(image)
+        detect_time = (time.perf_counter() - start) / repeats
+        start = time.perf_counter()
+        for _ in range(repeats):
+            extract_regions(image)
+        total_time = (time.perf_counter() - start) / repeats
+        print(f'{label}: 检测 {detect_time * 1e3:.2f} 毫秒，检测 + 全部区域取色 {total_time * 1e3:.2f} 毫秒')
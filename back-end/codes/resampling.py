@@ -0,0 +1,168 @@
+"""蒙特卡洛交叉验证（MCCV）和 bootstrap 的模型稳定性评估
+
+对应 back-end/matlab/libPLS_1.98 中的 plsmccv.m / mcs.m：反复随机划分训练集和测试集（MCCV），
+或有放回抽样得到训练集、用袋外样本测试（bootstrap），每次用 fast_pls 拟合并记录测试集上的 RMSEP 和 R²，
+最后按染料（整体）和催化剂分组给出分布，而不是只看一次 train_test_split(random_state=42) 的结果。
+
+多进程时由 shared_pool.map_shared 把数据放进共享内存，迭代按 CHUNK_ITERATIONS 分块，结果与进程数无关。
+
+    python resampling.py --iterations 2000 --method bootstrap --jobs 4
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from fast_pls import FastPLS
+from shared_pool import chunk_counts, map_shared, spawn_seeds
+
+METHODS = ('mccv', 'bootstrap')
+# 每个任务的迭代数，固定下来保证种子的划分与进程数无关
+CHUNK_ITERATIONS = 50
+
+
+def _split_block(block, n_features, n_targets):
+    X = block[:, :n_features]
+    Y = block[:, n_features:n_features + n_targets]
+    groups = block[:, -1].astype(np.int64)
+    return X, Y, groups
+
+
+def _group_metrics(errors, Y, mask):
+    """测试样本中属于某一组的 RMSEP 和 R²，样本少于 2 个时为 NaN"""
+    if mask.sum() < 2:
+        return np.nan, np.nan
+    e = errors[mask]
+    y = Y[mask]
+    sse = np.einsum('nm,nm->m', e, e)
+    sst = np.einsum('nm,nm->m', y - y.mean(axis=0), y - y.mean(axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = np.where(sst > 0, 1 - sse / sst, np.nan)
+    return np.sqrt(sse / mask.sum()), r2
+
+
+def run_chunk(data, count, seed, method, ratio, n_components, n_groups):
+    """执行 count 次重抽样，返回 (rmsep, r2)，形状都是 (count, n_groups + 1, m)；第 0 组是全部测试样本"""
+    X, Y, groups = data
+    n = len(X)
+    rng = np.random.default_rng(seed)
+    rmsep = np.full((count, n_groups + 1, Y.shape[1]), np.nan)
+    r2 = np.full_like(rmsep, np.nan)
+    n_train = int(n * ratio)
+    model = FastPLS(n_components)
+
+    for i in range(count):
+        if method == 'mccv':
+            order = rng.permutation(n)
+            train, test = order[:n_train], order[n_train:]
+        else:
+            train = rng.integers(0, n, n)
+            out_of_bag = np.ones(n, dtype=bool)
+            out_of_bag[train] = False
+            test = np.flatnonzero(out_of_bag)
+        if len(test) < 2:
+            continue
+        model.fit(X[train], Y[train])
+        errors = model.predict(X[test]) - Y[test]
+        test_groups = groups[test]
+        rmsep[i, 0], r2[i, 0] = _group_metrics(errors, Y[test], np.ones(len(test), dtype=bool))
+        for g in range(n_groups):
+            rmsep[i, g + 1], r2[i, g + 1] = _group_metrics(errors, Y[test], test_groups == g)
+    return rmsep, r2
+
+
+def _run_chunk_job(block, n_features, n_targets, *args):
+    return run_chunk(_split_block(block, n_features, n_targets), *args)
+
+
+class ResamplingResult:
+    """rmsep / r2: (迭代次数, 分组数 + 1, 目标数)，分组名见 group_names（第一个为 'all'）"""
+
+    def __init__(self, rmsep, r2, group_names, target_names):
+        self.rmsep = rmsep
+        self.r2 = r2
+        self.group_names = ['all'] + list(group_names)
+        self.target_names = list(target_names)
+
+    def summary(self):
+        """每个分组、每个目标的 RMSEP 和 R² 分布（均值、标准差、5/50/95 分位数）"""
+        rows = []
+        for g, group in enumerate(self.group_names):
+            for j, target in enumerate(self.target_names):
+                for metric, values in (('RMSEP', self.rmsep[:, g, j]), ('R2', self.r2[:, g, j])):
+                    values = values[~np.isnan(values)]
+                    if len(values) == 0:
+                        continue
+                    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+                    rows.append({'group': group, 'target': target, 'metric': metric, 'runs': len(values),
+                                 'mean': values.mean(), 'std': values.std(ddof=1) if len(values) > 1 else 0.0,
+                                 'p5': p5, 'p50': p50, 'p95': p95})
+        return pd.DataFrame(rows)
+
+
+def resample(X, Y, groups, n_iterations=1000, method='mccv', ratio=0.8, n_components=3,
+             jobs=1, seed=0, target_names=None):
+    """重复 n_iterations 次随机划分（mccv）或有放回抽样（bootstrap），返回 ResamplingResult
+
+    groups 为每个样本的分组名（例如催化剂），同时给出每组测试样本上的指标。
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y.reshape(-1, 1)
+    group_names, group_codes = np.unique(np.asarray(groups), return_inverse=True)
+    if target_names is None:
+        target_names = [f'y{j}' for j in range(Y.shape[1])]
+
+    counts = chunk_counts(n_iterations, CHUNK_ITERATIONS)
+    seeds = spawn_seeds(seed, len(counts))
+    jobs_args = [(X.shape[1], Y.shape[1], count, child, method, ratio, n_components, len(group_names))
+                 for count, child in zip(counts, seeds)]
+
+    block = np.column_stack((X, Y, group_codes.astype(np.float64)))
+    outcomes = map_shared(_run_chunk_job, block, jobs_args, jobs)
+
+    rmsep = np.concatenate([o[0] for o in outcomes])
+    r2 = np.concatenate([o[1] for o in outcomes])
+    return ResamplingResult(rmsep, r2, group_names, target_names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--collections', nargs='+', default=['all_blue', 'all_orange'],
+                        help='dataset_store 中的分组，每个分组（一种染料）单独建模')
+    parser.add_argument('--method', choices=METHODS, default='mccv')
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--ratio', type=float, default=0.8, help='MCCV 中训练集所占比例')
+    parser.add_argument('--n-components', type=int, default=3)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='进程数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='把汇总结果另存为 CSV')
+    args = parser.parse_args()
+
+    from dataset_store import load
+
+    targets = ['Absorbance', 'Concentration']
+    summaries = []
+    for collection in args.collections:
+        data = load(collection, columns=['Red', 'Green', 'Blue'] + targets + ['dye', 'catalyst'])
+        start = time.perf_counter()
+        result = resample(data[['Red', 'Green', 'Blue']].values, data[targets].values, data['catalyst'].values,
+                          args.iterations, args.method, args.ratio, args.n_components, args.jobs, args.seed,
+                          target_names=targets)
+        elapsed = time.perf_counter() - start
+        summary = result.summary()
+        summary.insert(0, 'dye', data['dye'].iloc[0] if len(data) else collection)
+        summaries.append(summary)
+        print(f'{collection}: {len(data)} 个样本，{args.iterations} 次 {args.method}，耗时 {elapsed:.2f} 秒')
+        print(summary[summary['metric'] == 'RMSEP'].to_string(index=False, float_format=lambda v: f'{v:.4f}'))
+
+    if args.output:
+        pd.concat(summaries, ignore_index=True).to_csv(args.output, index=False)
+        print(f'汇总结果已保存到 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_digest(data):
+    """上传内容的哈希，同时用作缓存键和文件存储的键"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def content_key(digest, model_version):
+    """缓存键：上传内容的哈希 + 模型版本，换模型后旧结果自然失效"""
+    return digest + ':' + model_version
+
+
+class _InFlight:
+    """一次正在进行的计算，重复的请求等待它完成后共享结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResultCache:
+    """有容量上限的 LRU 结果缓存，带命中统计和进行中请求合并"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute, inflight_key=None):
+        """先查缓存；未命中时计算并缓存结果
+
+        提供 inflight_key（例如请求头中的 Idempotency-Key）时，内容（key）和 inflight_key 都相同的并发请求
+        只有第一个真正计算，其余的等待并共享它的结果；客户端对不同内容误用同一个键时各自计算。
+        compute 返回 (结果, 缓存键)：缓存键为 None 时不缓存，通常与 key 相同，
+        计算实际使用的模型版本与查找时不同时由 compute 给出实际的键。
+        """
+        result = self.get(key)
+        if result is not None:
+            return result
+
+        if inflight_key is None:
+            result, cache_key = compute()
+            if cache_key is not None:
+                self.put(cache_key, result)
+            return result
+
+        inflight_key = (key, inflight_key)
+        with self._lock:
+            inflight = self._inflight.get(inflight_key)
+            owner = inflight is None
+            if owner:
+                inflight = self._inflight[inflight_key] = _InFlight()
+            else:
+                self.shared += 1
+
+        if not owner:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.result
+
+        try:
+            result, cache_key = compute()
+            if cache_key is not None:
+                self.put(cache_key, result)
+            inflight.result = result
+            return result
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[inflight_key]
+            inflight.done.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'shared_inflight': self.shared,
+                'evictions': self.evictions,
+                'inflight': len(self._inflight)
+            }
@@ -0,0 +1,102 @@
+import numpy as np
+import cv2
+
+# 理想白色的RGB值
+IDEAL_WHITE = 255.0
+
+# 每个条带最多处理的像素数。cv2.calcHist 返回 float32 计数，
+# 单个条带不超过 2^24 个像素时计数是精确的，同时限制了单次处理的内存峰值
+STRIP_PIXELS = 1 << 20
+
+
+def corner_white_average(img):
+    """计算四个角白色区域的平均颜色（通道顺序与输入一致），不拼接、不复制整块区域"""
+    height, width = img.shape[:2]
+    corner_h = height // 8
+    corner_w = width // 8
+
+    corners = (
+        img[:corner_h, :corner_w],  # 左上角
+        img[:corner_h, -corner_w:],  # 右上角
+        img[-corner_h:, :corner_w],  # 左下角
+        img[-corner_h:, -corner_w:]  # 右下角
+    )
+
+    # 按列累加四个角的整数和（精确），再逐列求平均、对列取平均，
+    # 与把四个角沿行方向拼接后再 np.average 两次的结果逐位一致
+    column_sums = sum(np.sum(corner, axis=0, dtype=np.int64) for corner in corners)
+    avg_color_per_column = column_sums / (4 * corner_h)
+    return np.average(avg_color_per_column, axis=0)
+
+
+def channel_histograms(roi, strip_pixels=STRIP_PIXELS):
+    """按条带累积每个通道的 256 级直方图，返回形状为 (3, 256) 的整数计数"""
+    height, width = roi.shape[:2]
+    strip_rows = max(1, strip_pixels // max(1, width))
+
+    hist = np.zeros((3, 256), dtype=np.int64)
+    for y in range(0, height, strip_rows):
+        strip = roi[y:y + strip_rows]
+        for c in range(3):
+            hist[c] += cv2.calcHist([strip], [c], None, [256], [0, 256]).ravel().astype(np.int64)
+    return hist
+
+
+def corrected_mean(hist, correction_factor, truncate=True):
+    """根据直方图计算“逐像素乘校正因子再截断到[0, 255]”之后的平均值
+
+    校正是逐通道的标量乘法加截断，所以每个灰度级映射到的值只需算一次（查找表），
+    均值等于直方图与查找表的加权和，结果与逐像素计算完全一致。
+    truncate=True 时对应先转回 uint8 再求平均的做法。
+    """
+    levels = np.arange(256, dtype=np.float64)
+    means = np.zeros(3)
+    for c in range(3):
+        lut = np.clip(levels * correction_factor[c], 0, 255)
+        if truncate:
+            lut = lut.astype(np.uint8)
+        n = hist[c].sum()
+        means[c] = np.dot(hist[c], lut) / n if n else 0.0
+    return means
+
+
+def center_box(height, width):
+    """中心区域（去掉上下左右各1/4）的坐标 (x, y, w, h)"""
+    return width // 4, height // 4, width // 2, height // 2
+
+
+def box_mean(img, box, correction_factor, truncate=True, strip_pixels=STRIP_PIXELS):
+    """按校正因子白平衡后 box=(x, y, w, h) 区域的平均颜色，通道顺序与输入一致"""
+    x, y, w, h = box
+    hist = channel_histograms(img[y:y + h, x:x + w], strip_pixels)
+    return corrected_mean(hist, correction_factor, truncate)
+
+
+def shrink(img, max_pixels):
+    """把图像缩小到 max_pixels 以内（INTER_AREA 按面积平均），本来就小的图像不复制
+
+    大图先按步长取子视图（不复制）到约 4 倍目标像素，再做面积平均，只读取需要的像素。
+    """
+    height, width = img.shape[:2]
+    if height * width <= max_pixels:
+        return img
+    step = int(np.sqrt(height * width / (4 * max_pixels)))
+    if step > 1:
+        img = img[::step, ::step]
+        height, width = img.shape[:2]
+    scale = np.sqrt(max_pixels / (height * width))
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def white_balanced_center_mean(img, truncate=True, strip_pixels=STRIP_PIXELS):
+    """四角白平衡后中心区域的平均颜色，返回 (均值, 中心区域坐标)，均值通道顺序与输入一致"""
+    height, width = img.shape[:2]
+
+    # 计算白色校正因子，目标是将白色矫正到理想的白色
+    avg_white_colors = corner_white_average(img)
+    correction_factor = IDEAL_WHITE / avg_white_colors
+
+    # 对中心区域统计直方图，再通过查找表得到校正后的均值，不产生浮点副本
+    box = center_box(height, width)
+    return box_mean(img, box, correction_factor, truncate, strip_pixels), box
@@ -1,5 +1,24 @@
+import argparse
+import os
+
 from waitress import serve
-from app import app  # 从app.py中导入app对象
 
 if __name__ == '__main__':
-    serve(app, host='0.0.0.0', port=5000)
+    # 在这里导入 app：工作进程（spawn）会重新执行本文件，不能让它们也创建 app 和后台线程
+    from app import app, enable_worker_pool  # 从app.py中导入app对象
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKER_PROCESSES', '0')),
+                        help='处理图片的工作进程数，0 表示直接在 waitress 线程中处理')
+    parser.add_argument('--queue', type=int, default=int(os.environ.get('WORKER_QUEUE', '8')),
+                        help='工作进程都忙时最多排队的请求数，超过后直接返回 503')
+    parser.add_argument('--threads', type=int, default=None, help='waitress 线程数')
+    args = parser.parse_args()
+
+    threads = args.threads or 4
+    if args.workers > 0:
+        enable_worker_pool(args.workers, args.queue)
+        # 线程数要多于可接纳的请求数，满载时才能及时返回 503
+        threads = args.threads or args.workers + args.queue + 2
+
+    serve(app, host='0.0.0.0', port=5000, threads=threads)
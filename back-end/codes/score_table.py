@@ -0,0 +1,207 @@
+"""用保存的蓝色/橙色模型批量打分大型 RGB 表格，内存占用不随文件大小增长
+
+按块读取输入（CSV、Parquet，或 xlsx 的只读流式模式），每块按 Red>Blue 分组各调用一次模型，
+结果逐块追加写出（CSV、Parquet，或 openpyxl write_only 模式的 xlsx）。多个输入文件分配到多个进程，
+每个进程各自加载一次模型。输出在原有列之后增加 ColorType、PredictedAbsorbance、PredictedConcentration。
+
+    python score_table.py ../newData/light/*.csv --model-dir ../model --format parquet --jobs 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from model_registry import ModelRegistry
+
+RGB_COLUMNS = ['Red', 'Green', 'Blue']
+FORMATS = ('csv', 'parquet', 'xlsx')
+CHUNK_ROWS = 100000
+
+# 工作进程中的模型，由 _init_worker 在进程启动时加载
+_models = None
+
+
+def _init_worker(model_dir):
+    global _models
+    _models = ModelRegistry(model_dir).current()
+
+
+def _format_of(path):
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    return 'xlsx' if ext in ('xlsx', 'xlsm') else ext
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """按块读取输入文件，每次返回一个最多 chunk_rows 行的 DataFrame"""
+    fmt = _format_of(path)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    elif fmt == 'xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(name) for name in next(rows, ())]
+            block = []
+            for row in rows:
+                block.append(row)
+                if len(block) >= chunk_rows:
+                    yield pd.DataFrame(block, columns=header)
+                    block = []
+            if block:
+                yield pd.DataFrame(block, columns=header)
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f'不支持的输入格式: {path}')
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.file, header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.writer = None
+
+    def write(self, df):
+        table = self.pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class XlsxWriter:
+    """openpyxl 的 write_only 模式，写过的行直接落到临时文件，不在内存中保留"""
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.header = True
+
+    def write(self, df):
+        if self.header:
+            self.sheet.append([str(name) for name in df.columns])
+            self.header = False
+        for row in df.itertuples(index=False):
+            self.sheet.append([None if isinstance(v, float) and np.isnan(v) else v for v in row])
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+WRITERS = {'csv': CsvWriter, 'parquet': ParquetWriter, 'xlsx': XlsxWriter}
+
+
+def score_chunk(df, models):
+    """在 DataFrame 后面追加颜色类型和预测结果"""
+    missing = [c for c in RGB_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f'缺少列: {", ".join(missing)}')
+    color_types, absorbance, concentration = models.predict_batch(df[RGB_COLUMNS].to_numpy(dtype=np.float64))
+    df = df.copy()
+    df['ColorType'] = color_types
+    df['PredictedAbsorbance'] = absorbance
+    df['PredictedConcentration'] = concentration
+    return df
+
+
+def output_path_for(path, output_dir, fmt):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir or os.path.dirname(path), f'{stem}-predicted.{fmt}')
+
+
+def score_file(path, output_path, fmt, chunk_rows=CHUNK_ROWS, models=None):
+    """逐块打分一个文件，先写到临时文件，完成后再替换，返回 (行数, 耗时)"""
+    if models is None:
+        models = _models
+    start = time.perf_counter()
+    tmp_path = output_path + '.tmp'
+    writer = WRITERS[fmt](tmp_path)
+    rows = 0
+    try:
+        for chunk in iter_chunks(path, chunk_rows):
+            writer.write(score_chunk(chunk, models))
+            rows += len(chunk)
+    finally:
+        writer.close()
+    os.replace(tmp_path, output_path)
+    return rows, time.perf_counter() - start
+
+
+def _score_job(job):
+    path, output_path, fmt, chunk_rows = job
+    try:
+        rows, elapsed = score_file(path, output_path, fmt, chunk_rows)
+        return path, output_path, rows, elapsed, None
+    except Exception as e:
+        if os.path.exists(output_path + '.tmp'):
+            os.remove(output_path + '.tmp')
+        return path, output_path, 0, 0.0, f'{type(e).__name__}: {e}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='输入文件（.csv / .parquet / .xlsx）')
+    parser.add_argument('--model-dir', default=os.environ.get('MODEL_DIR', '.'))
+    parser.add_argument('--format', choices=FORMATS, default='csv', help='输出格式')
+    parser.add_argument('--output-dir', help='输出目录，默认与输入文件相同')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='每块的行数')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='进程数')
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [(path, output_path_for(path, args.output_dir, args.format), args.format, args.chunk_rows)
+            for path in args.inputs]
+    workers = max(1, min(args.jobs, len(jobs)))
+
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(args.model_dir)
+        results = [_score_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(args.model_dir,)) as executor:
+            results = list(executor.map(_score_job, jobs))
+
+    failed = 0
+    for path, output_path, rows, elapsed, error in results:
+        if error:
+            failed += 1
+            print(f'{path}: 失败 ({error})')
+        else:
+            print(f'{path}: {rows} 行，耗时 {elapsed:.2f} 秒 -> {output_path}')
+    print(f'共 {len(results)} 个文件，失败 {failed} 个，总耗时 {time.perf_counter() - start:.2f} 秒')
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""共享内存 + 进程池的分块任务执行，resampling.py 和 variable_selection.py 共用
+
+数据矩阵只放进共享内存一次，工作进程启动时挂载，任务参数里只有迭代数和随机种子。
+迭代按固定大小分块（chunk_counts），每块的种子由 SeedSequence 派生（spawn_seeds），结果与进程数无关，可以复现。
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 工作进程中的数据矩阵，由 _init_worker 挂载共享内存后得到
+_shm = None
+_block = None
+
+
+def chunk_counts(n_iterations, chunk):
+    """把 n_iterations 次迭代按每块 chunk 次划分，返回每块的迭代数"""
+    return [min(chunk, n_iterations - start) for start in range(0, n_iterations, chunk)]
+
+
+def spawn_seeds(seed, count):
+    """由 seed 派生 count 个互相独立的种子"""
+    return np.random.SeedSequence(seed).spawn(count)
+
+
+def _init_worker(name, shape):
+    global _shm, _block
+    _shm = shared_memory.SharedMemory(name=name)
+    _block = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+
+
+def _run_job(job):
+    function, args = job
+    return function(_block, *args)
+
+
+def map_shared(function, block, jobs_args, jobs=1):
+    """对每组参数执行 function(block, *args)，按 jobs_args 的顺序返回结果
+
+    jobs <= 1 或只有一个任务时在本进程执行；否则 block 只复制到共享内存一次，交给进程池，
+    此时 function 必须是模块级函数（能被 pickle）。
+    """
+    block = np.ascontiguousarray(block, dtype=np.float64)
+    if jobs <= 1 or len(jobs_args) <= 1:
+        return [function(block, *args) for args in jobs_args]
+    shm = shared_memory.SharedMemory(create=True, size=block.nbytes)
+    try:
+        np.ndarray(block.shape, dtype=np.float64, buffer=shm.buf)[:] = block
+        with ProcessPoolExecutor(min(jobs, len(jobs_args)), initializer=_init_worker,
+                                 initargs=(shm.name, block.shape)) as executor:
+            return list(executor.map(_run_job, [(function, args) for args in jobs_args]))
+    finally:
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,255 @@
+"""CARS 和蒙特卡洛 UVE（MC-UVE）变量选择，候选变量为 RGB 及由它派生的颜色特征
+
+对应 back-end/matlab/libPLS_1.98 中的 carspls.m 和 mcuvepls.m。候选变量除 Red/Green/Blue 外，
+还有通道比值、对数比值、色度坐标和二次项（见 DERIVED_NAMES），每种染料、每个目标各自选一组变量。
+
+- CARS：每轮随机抽 90% 样本拟合 PLS，按回归系数绝对值保留的变量数指数递减，再按系数加权有放回抽样，
+  最后对每轮留下的变量子集做交叉验证，取 RMSECV 最小的一轮。CARS 本身带随机性（carspls.m 的 originalVersion=1），
+  这里独立运行 runs 次，每次一个任务，取其中 RMSECV 最小的结果，同时给出各变量被选中的频率。
+- MC-UVE：反复随机抽 75% 样本拟合 PLS，用回归系数的均值 / 标准差衡量变量的稳定性，
+  按稳定性从高到低取前 k 个变量做交叉验证，选 RMSECV 最小的 k。
+
+派生特征和标准化后的矩阵按数据集的源文件指纹缓存在 CACHE_PATH，源文件不变时直接读取；
+多进程时由 shared_pool.map_shared 把矩阵放进共享内存，任务参数里只有随机种子，结果与进程数无关。
+
+    python variable_selection.py --runs 50 --mc-iterations 1000 --jobs 4
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from fast_pls import FastPLS, cross_validate
+from shared_pool import chunk_counts, map_shared, spawn_seeds
+
+CACHE_PATH = '../Data/selection_cache.npz'
+TARGETS = ('Absorbance', 'Concentration')
+RGB_NAMES = ('Red', 'Green', 'Blue')
+_PAIRS = (('Red', 'Green'), ('Red', 'Blue'), ('Green', 'Blue'))
+DERIVED_NAMES = (
+    list(RGB_NAMES)
+    + [f'{a}/{b}' for a, b in _PAIRS]
+    + [f'log({a}/{b})' for a, b in _PAIRS]
+    + ['r_chroma', 'g_chroma', 'b_chroma']
+    + [f'{c}^2' for c in RGB_NAMES]
+    + [f'{a}*{b}' for a, b in _PAIRS]
+)
+# MC-UVE 每个任务的迭代数，固定下来保证种子的划分与进程数无关
+CHUNK_ITERATIONS = 100
+
+
+def derive_features(rgb):
+    """由 (n, 3) 的 RGB 生成 (n, len(DERIVED_NAMES)) 的候选变量，列顺序与 DERIVED_NAMES 一致"""
+    rgb = np.asarray(rgb, dtype=np.float64)
+    # 比值和对数以 1 为下限，避免全黑通道除零
+    safe = np.maximum(rgb, 1.0)
+    channel = dict(zip(RGB_NAMES, rgb.T))
+    safe_channel = dict(zip(RGB_NAMES, safe.T))
+    total = safe.sum(axis=1)
+    columns = [channel[c] for c in RGB_NAMES]
+    columns += [safe_channel[a] / safe_channel[b] for a, b in _PAIRS]
+    columns += [np.log(safe_channel[a] / safe_channel[b]) for a, b in _PAIRS]
+    columns += [safe_channel[c] / total for c in RGB_NAMES]
+    columns += [channel[c] ** 2 for c in RGB_NAMES]
+    columns += [channel[a] * channel[b] for a, b in _PAIRS]
+    return np.column_stack(columns)
+
+
+def autoscale(A):
+    """按列减均值、除标准差（ddof=1），常数列只减均值"""
+    mean = A.mean(axis=0)
+    std = A.std(axis=0, ddof=1) if len(A) > 1 else np.ones(A.shape[1:])
+    std = np.where(std > 0, std, 1.0)
+    return (A - mean) / std
+
+
+def standardized(collections, cache_path=CACHE_PATH):
+    """返回 {分组名: (标准化后的候选变量 X, 标准化后的目标 Y)}，源文件没有变化时从缓存读取"""
+    from dataset_store import fingerprint, load, source_files
+
+    key = json.dumps([fingerprint(source_files()), DERIVED_NAMES, TARGETS])
+    cached = {}
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as store:
+                if str(store['__key__']) == key:
+                    cached = {name: store[name] for name in store.files}
+        except (OSError, KeyError, ValueError):
+            cached = {}
+
+    result = {}
+    missing = [c for c in collections if f'{c}/X' not in cached]
+    for collection in missing:
+        data = load(collection, columns=list(RGB_NAMES) + list(TARGETS))
+        data = data.dropna()
+        cached[f'{collection}/X'] = autoscale(derive_features(data[list(RGB_NAMES)].values))
+        cached[f'{collection}/Y'] = autoscale(data[list(TARGETS)].values)
+    if missing:
+        cached['__key__'] = np.array(key)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **cached)
+        os.replace(tmp_path, cache_path)
+    for collection in collections:
+        result[collection] = (cached[f'{collection}/X'], cached[f'{collection}/Y'])
+    return result
+
+
+def _cv_folds(y, fold):
+    """与 plscv.m 的 order=0 一致：按 y 排序后依次轮流分到各折"""
+    order = np.argsort(y, kind='stable')
+    return [(None, order[k::fold]) for k in range(fold)]
+
+
+def _cv_1sd(X, y, max_components, folds):
+    """交叉验证并按 plscv.m 的“最小 MSE + 1 倍标准差”规则选成分数，返回 (RMSECV, 成分数)"""
+    result = cross_validate(X, y, max_components, folds, scale=False)
+    errors2 = (result.predictions[:, :, 0] - y[None]) ** 2
+    mse = errors2.mean(axis=1)
+    best = int(np.argmin(mse))
+    limit = mse[best] + errors2[best].std(ddof=1)
+    a = int(np.flatnonzero(mse <= limit)[0])
+    return float(np.sqrt(mse[a])), a + 1
+
+
+def _coefficients(X, y, n_components):
+    model = FastPLS(n_components, scale=False).fit(X, y)
+    return model.coef_[-1][:, 0]
+
+
+def cars_run(X, y, seed, n_components=3, fold=5, num=50):
+    """一次 CARS，返回 (选中的变量索引, RMSECV, 成分数)"""
+    rng = np.random.default_rng(seed)
+    n, p = X.shape
+    n_calibration = int(n * 0.9)
+    # 保留比例从 1 按指数递减到 2 / p
+    b = np.log(p / 2) / (num - 1)
+    a = np.exp(b)
+
+    selected = np.arange(p)
+    subsets = []
+    for iteration in range(1, num + 1):
+        calibration = rng.permutation(n)[:n_calibration]
+        w = np.zeros(p)
+        w[selected] = _coefficients(X[np.ix_(calibration, selected)], y[calibration],
+                                    min(n_components, len(selected)))
+        subsets.append(np.flatnonzero(w))
+        w = np.abs(w)
+        keep = int(np.round(p * a * np.exp(-b * (iteration + 1))))
+        w[np.argsort(-w, kind='stable')[keep:]] = 0
+        if w.sum() == 0:
+            break
+        selected = np.unique(rng.choice(p, p, replace=True, p=w / w.sum()))
+
+    folds = _cv_folds(y, fold)
+    best = (None, np.inf, 0)
+    for subset in subsets:
+        if len(subset) == 0:
+            continue
+        rmsecv, lv = _cv_1sd(X[:, subset], y, min(n_components, len(subset)), folds)
+        if rmsecv < best[1]:
+            best = (subset, rmsecv, lv)
+    return best
+
+
+def mcuve_chunk(X, y, count, seed, n_components=3, ratio=0.75):
+    """count 次随机抽样拟合 PLS，返回回归系数 (count, p)"""
+    rng = np.random.default_rng(seed)
+    n = len(X)
+    k = int(n * ratio)
+    coef = np.zeros((count, X.shape[1]))
+    for i in range(count):
+        calibration = rng.permutation(n)[:k]
+        coef[i] = _coefficients(X[calibration], y[calibration], n_components)
+    return coef
+
+
+# 任务在 [X | y] 拼成的矩阵上执行，最后一列为 y
+def _cars_job(block, *args):
+    return cars_run(block[:, :-1], block[:, -1], *args)
+
+
+def _mcuve_job(block, *args):
+    return mcuve_chunk(block[:, :-1], block[:, -1], *args)
+
+
+def cars(X, y, runs=50, n_components=3, fold=5, num=50, jobs=1, seed=0):
+    """独立运行 runs 次 CARS，返回 (最优变量索引, RMSECV, 成分数, 各变量被选中的频率)"""
+    seeds = spawn_seeds(seed, runs)
+    results = map_shared(_cars_job, np.column_stack((X, y)), [(s, n_components, fold, num) for s in seeds], jobs)
+    frequency = np.zeros(X.shape[1])
+    for subset, _, _ in results:
+        if subset is not None:
+            frequency[subset] += 1
+    subset, rmsecv, lv = min(results, key=lambda r: r[1])
+    return subset, rmsecv, lv, frequency / runs
+
+
+def mcuve(X, y, n_iterations=1000, n_components=3, ratio=0.75, fold=5, jobs=1, seed=0):
+    """MC-UVE，返回 (最优变量索引, RMSECV, 成分数, 每个变量的稳定性 mean/std)"""
+    counts = chunk_counts(n_iterations, CHUNK_ITERATIONS)
+    seeds = spawn_seeds(seed, len(counts))
+    coef = np.concatenate(map_shared(_mcuve_job, np.column_stack((X, y)),
+                                     [(count, s, n_components, ratio) for count, s in zip(counts, seeds)], jobs))
+    std = coef.std(axis=0, ddof=1)
+    reliability = np.divide(coef.mean(axis=0), std, out=np.zeros(X.shape[1]), where=std > 0)
+
+    order = np.argsort(-np.abs(reliability), kind='stable')
+    folds = _cv_folds(y, fold)
+    best = (None, np.inf, 0)
+    for k in range(1, X.shape[1] + 1):
+        subset = np.sort(order[:k])
+        rmsecv, lv = _cv_1sd(X[:, subset], y, min(n_components, k), folds)
+        if rmsecv < best[1]:
+            best = (subset, rmsecv, lv)
+    return (*best, reliability)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--collections', nargs='+', default=['all_blue', 'all_orange'],
+                        help='dataset_store 中的分组，每个分组（一种染料）单独选变量')
+    parser.add_argument('--runs', type=int, default=50, help='CARS 独立运行次数')
+    parser.add_argument('--num', type=int, default=50, help='每次 CARS 的抽样轮数')
+    parser.add_argument('--mc-iterations', type=int, default=1000, help='MC-UVE 的抽样次数')
+    parser.add_argument('--n-components', type=int, default=3)
+    parser.add_argument('--fold', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='进程数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='把选择结果另存为 CSV')
+    args = parser.parse_args()
+
+    rows = []
+    for collection, (X, Y) in standardized(args.collections).items():
+        for j, target in enumerate(TARGETS):
+            y = Y[:, j]
+            start = time.perf_counter()
+            baseline, baseline_lv = _cv_1sd(X[:, :len(RGB_NAMES)], y, args.n_components, _cv_folds(y, args.fold))
+            cars_subset, cars_rmsecv, cars_lv, frequency = cars(
+                X, y, args.runs, args.n_components, args.fold, args.num, args.jobs, args.seed)
+            uve_subset, uve_rmsecv, uve_lv, reliability = mcuve(
+                X, y, args.mc_iterations, args.n_components, fold=args.fold, jobs=args.jobs, seed=args.seed)
+            elapsed = time.perf_counter() - start
+
+            print(f'{collection} / {target}（{len(X)} 个样本，耗时 {elapsed:.2f} 秒），RMSECV 为标准化后的 y：')
+            print(f'  RGB:    {baseline:.4f}（{baseline_lv} 个成分）')
+            for method, subset, rmsecv, lv in (('CARS', cars_subset, cars_rmsecv, cars_lv),
+                                               ('MC-UVE', uve_subset, uve_rmsecv, uve_lv)):
+                names = [DERIVED_NAMES[i] for i in subset]
+                print(f'  {method + ":":7} {rmsecv:.4f}（{lv} 个成分）{", ".join(names)}')
+                rows.append({'collection': collection, 'target': target, 'method': method,
+                             'rmsecv': rmsecv, 'baseline_rmsecv': baseline, 'n_components': lv,
+                             'features': ';'.join(names)})
+            top = np.argsort(-frequency, kind='stable')[:5]
+            print('  CARS 选中频率最高: ' + ', '.join(f'{DERIVED_NAMES[i]} {frequency[i]:.0%}' for i in top))
+
+    if args.output:
+        pd.DataFrame(rows).to_csv(args.output, index=False)
+        print(f'选择结果已保存到 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from model_registry import ModelRegistry
+from pipeline import analyze_image
+
+# 工作进程中的模型注册表，由 _init_worker 在进程启动时创建并加载
+_registry = None
+# 上一次为之重新加载的主进程模型版本，重新加载后仍不一致（目录又变了）时不会每个任务都重新加载
+_reloaded_for = None
+
+
+def _init_worker(model_dir):
+    global _registry
+    _registry = ModelRegistry(model_dir)
+    _registry.current()
+
+
+def _models(expected_version):
+    """返回工作进程的 ModelSet；与主进程的版本不同时（主进程已切换模型）先重新加载"""
+    global _reloaded_for
+    models = _registry.current()
+    if expected_version is None or models.version == expected_version or expected_version == _reloaded_for:
+        return models
+    _reloaded_for = expected_version
+    try:
+        return _registry.reload()
+    except Exception as e:
+        # 新模型加载失败时继续使用旧模型，结果中的版本号仍是旧模型的
+        print("Model reload failed:", repr(e))
+        return models
+
+
+def _warm_up(_):
+    # 让每个进程都启动并完成初始化
+    time.sleep(0.2)
+
+
+def _analyze(data, reduce, max_pixels, expected_version):
+    start = time.perf_counter()
+    result = analyze_image(data, _models(expected_version), reduce, max_pixels)
+    return result, time.perf_counter() - start
+
+
+class PoolSaturated(Exception):
+    """正在处理和排队的请求都已满"""
+
+
+class WorkerPool:
+    """预先启动的工作进程池，每个进程各自加载模型，图片的解码和计算在进程中执行，不受 GIL 限制
+
+    同时最多接受 workers + queue_size 个请求，再多的请求立即抛出 PoolSaturated，
+    由调用方返回 503，而不是让客户端一直等到超时。
+    工作进程不监视模型目录：每个任务带上主进程当前的模型版本，不一致时工作进程先重新加载。
+    """
+
+    def __init__(self, workers, queue_size, model_dir):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(model_dir,))
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_time = 0.0
+        self.started_at = time.time()
+
+        # 启动时就创建全部进程并加载模型，第一个请求不用等
+        list(self._executor.map(_warm_up, range(workers)))
+
+    def analyze(self, data, reduce, max_pixels, expected_version=None):
+        """在工作进程中处理一张图片，满载时抛出 PoolSaturated
+
+        expected_version 为主进程当前的 ModelSet.version，工作进程的模型版本不同时先重新加载
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturated()
+        with self._lock:
+            self.inflight += 1
+        try:
+            result, busy = self._executor.submit(_analyze, data, reduce, max_pixels, expected_version).result()
+            with self._lock:
+                self.completed += 1
+                self.busy_time += busy
+            return result
+        finally:
+            with self._lock:
+                self.inflight -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            uptime = time.time() - self.started_at
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'inflight': self.inflight,
+                'busy_workers': min(self.inflight, self.workers),
+                'queue_depth': max(0, self.inflight - self.workers),
+                'utilization': self.busy_time / (self.workers * uptime) if uptime > 0 else 0.0,
+                'completed': self.completed,
+                'rejected': self.rejected
+            }
+
+    def shutdown(self):
+        self._executor.shutdown()
@@ -3,12 +3,15 @@ import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.preprocessing import StandardScaler
 from sklearn.cross_decomposition import PLSRegression
-from sklearn.metrics import mean_squared_error, r2_score, make_scorer
-from sklearn.model_selection import cross_val_score, KFold
+from sklearn.model_selection import KFold
 import joblib
 import glob
 import os
 
+from fast_pls import cross_validate
+from applicability import attach_applicability, robust_inliers
+from pls_importance import attach_importance
+
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 使用黑体
 plt.rcParams['axes.unicode_minus'] = False  # 解决保存图像时负号显示为方块的问题
@@ -25,10 +28,18 @@ for file_path in file_paths:
 # 合并所有数据
 data = pd.concat(all_data, ignore_index=True)
 
-# 检查并移除离群点
-z_scores = np.abs((data - data.mean()) / data.std())  # 计算Z分数
-threshold = 2.1
-cleaned_data = data[(z_scores < threshold).all(axis=1)]  # 移除离群点
+# 检查并移除离群点：默认对整张表做 z 分数过滤；
+# 设置环境变量 OUTLIER_FILTER=robust 时改用 PLS 的 T²、Q、杠杆值和 y 残差迭代剔除（见 applicability.robust_inliers）
+outlier_filter = os.environ.get('OUTLIER_FILTER', 'zscore')
+if outlier_filter == 'robust':
+    inliers = robust_inliers(data[['Red', 'Green', 'Blue']].values, data[['Absorbance', 'Concentration']].values, 3)
+    cleaned_data = data[inliers]  # 移除离群点
+elif outlier_filter == 'zscore':
+    z_scores = np.abs((data - data.mean()) / data.std())  # 计算Z分数
+    threshold = 2.1
+    cleaned_data = data[(z_scores < threshold).all(axis=1)]  # 移除离群点
+else:
+    raise ValueError(f'未知的离群点过滤方式: {outlier_filter}（可选 zscore、robust）')
 
 # 提取特征和目标变量
 X = cleaned_data[['Red', 'Green', 'Blue']].values
@@ -45,36 +56,42 @@ y_absorbance_scaled = scaler_y_absorbance.fit_transform(y_absorbance.reshape(-1,
 scaler_y_concentration = StandardScaler()
 y_concentration_scaled = scaler_y_concentration.fit_transform(y_concentration.reshape(-1, 1)).ravel()
 
-# 建立PLS回归模型
-n_components = 3  # 选择PLS成分的数量，3最优
-pls_absorbance = PLSRegression(n_components=n_components)
-pls_concentration = PLSRegression(n_components=n_components)
-
 # 定义交叉验证 (KFold，5折交叉验证)
 kf = KFold(n_splits=5, shuffle=True, random_state=42)
 
-# R² 分数和 RMSE 作为评分标准
-def rmse(y_true, y_pred):
-    return np.sqrt(mean_squared_error(y_true, y_pred))
-
-scorer_r2 = make_scorer(r2_score)
-scorer_rmse = make_scorer(rmse, greater_is_better=False)
-
-# 吸光度交叉验证
-r2_scores_absorbance = cross_val_score(pls_absorbance, X_scaled, y_absorbance_scaled, cv=kf, scoring=scorer_r2)
-rmse_scores_absorbance = cross_val_score(pls_absorbance, X_scaled, y_absorbance_scaled, cv=kf, scoring=scorer_rmse)
-
-# 浓度交叉验证
-r2_scores_concentration = cross_val_score(pls_concentration, X_scaled, y_concentration_scaled, cv=kf, scoring=scorer_r2)
-rmse_scores_concentration = cross_val_score(pls_concentration, X_scaled, y_concentration_scaled, cv=kf, scoring=scorer_rmse)
+# 1~3 个成分、吸光度和浓度一起交叉验证：每折的模型由全体交叉积减去该折得到，所有指标一遍算完
+max_components = 3
+cv_result = cross_validate(X_scaled, np.column_stack((y_absorbance_scaled, y_concentration_scaled)),
+                           max_components=max_components, cv=kf)
+for a in range(1, cv_result.rmsecv.shape[0] + 1):
+    print(f'{a} 个成分 - RMSECV: 吸光度 {cv_result.rmsecv[a - 1, 0]:.3f}, 浓度 {cv_result.rmsecv[a - 1, 1]:.3f}')
+
+# 按 RMSECV 最小自动选择成分数（吸光度和浓度分别选择）
+n_components_absorbance, n_components_concentration = (int(a) for a in cv_result.best_n_components)
+print(f'选择的成分数 - 吸光度: {n_components_absorbance}, 浓度: {n_components_concentration}')
+pls_absorbance = PLSRegression(n_components=n_components_absorbance)
+pls_concentration = PLSRegression(n_components=n_components_concentration)
+
+# 每一折的 R² 和 RMSE（与 cross_val_score 的结果一致）
+r2_scores_absorbance = cv_result.fold_r2[n_components_absorbance - 1, :, 0]
+rmse_scores_absorbance = cv_result.fold_rmse[n_components_absorbance - 1, :, 0]
+r2_scores_concentration = cv_result.fold_r2[n_components_concentration - 1, :, 1]
+rmse_scores_concentration = cv_result.fold_rmse[n_components_concentration - 1, :, 1]
+summary = cv_result.summary(cv_result.best_n_components)
 
 # 打印交叉验证结果
-print(f'吸光度 - 平均 R²: {np.mean(r2_scores_absorbance):.3f}, 平均 RMSE: {np.mean(np.abs(rmse_scores_absorbance)):.3f}')
-print(f'浓度 - 平均 R²: {np.mean(r2_scores_concentration):.3f}, 平均 RMSE: {np.mean(np.abs(rmse_scores_concentration)):.3f}')
+print(f'吸光度 - 平均 R²: {np.mean(r2_scores_absorbance):.3f}, 平均 RMSE: {np.mean(np.abs(rmse_scores_absorbance)):.3f}, '
+      f'RPD: {summary["rpd"][0]:.3f}, 偏差: {summary["bias"][0]:.3f}')
+print(f'浓度 - 平均 R²: {np.mean(r2_scores_concentration):.3f}, 平均 RMSE: {np.mean(np.abs(rmse_scores_concentration)):.3f}, '
+      f'RPD: {summary["rpd"][1]:.3f}, 偏差: {summary["bias"][1]:.3f}')
 
 # 训练模型并保存
 pls_absorbance.fit(X_scaled, y_absorbance_scaled)
+attach_importance(pls_absorbance, X_scaled)
+attach_applicability(pls_absorbance, X_scaled)
 pls_concentration.fit(X_scaled, y_concentration_scaled)
+attach_importance(pls_concentration, X_scaled)
+attach_applicability(pls_concentration, X_scaled)
 
 # 保存模型和标准化器
 joblib.dump(pls_absorbance, 'corrected_orange_pls_absorbance_model.pkl')
@@ -5,8 +5,10 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.cross_decomposition import PLSRegression
 from sklearn.metrics import mean_squared_error, r2_score
 import joblib
-import glob
-import os
+
+from dataset_store import load
+from applicability import attach_applicability
+from pls_importance import attach_importance
 
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 使用黑体
@@ -38,9 +40,13 @@ pls_concentration = PLSRegression(n_components=n_components)
 
 # 训练吸光度模型
 pls_absorbance.fit(X_standard_scaled, y_absorbance_standard_scaled)
+attach_importance(pls_absorbance, X_standard_scaled)
+attach_applicability(pls_absorbance, X_standard_scaled)
 
 # 训练浓度模型
 pls_concentration.fit(X_standard_scaled, y_concentration_standard_scaled)
+attach_importance(pls_concentration, X_standard_scaled)
+attach_applicability(pls_concentration, X_standard_scaled)
 
 # 评估模型性能 - 校准阶段
 y_train_concentration_pred_scaled = pls_concentration.predict(X_standard_scaled)
@@ -62,16 +68,8 @@ joblib.dump(scaler_y_concentration_standard, 'BluePurple-scaler_y_concentration_
 
 # 2. 加载TiO2纳米球数据进行矫正
 # 加载检测数据
-test_data_path = '../newData/purple/blueAllData/*.xlsx'
-test_file_paths = glob.glob(test_data_path)
-test_data_all = []
-
-for file_path in test_file_paths:
-    test_data = pd.read_excel(file_path)
-    test_data_all.append(test_data)
-
-# 合并所有数据
-test_data_combined = pd.concat(test_data_all, ignore_index=True)
+# ../newData/purple/blueAllData 下的全部数据，从合并后的数据集读取
+test_data_combined = load('purple_blue', columns=['Absorbance', 'Red', 'Green', 'Blue'])
 
 # 提取特征和吸光度
 X_test = test_data_combined[['Red', 'Green', 'Blue']].values
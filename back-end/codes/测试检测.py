@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 import joblib
 
+from fused_pls import sklearn_predict
+
 # 加载模型和标准化器
 blue_pls_absorbance_model = joblib.load('BluePurple-trained_pls_absorbance_model.pkl')
 blue_pls_concentration_model = joblib.load('BluePurple-trained_pls_concentration_model.pkl')
@@ -65,27 +67,49 @@ def predict_concentration_absorbance(rgb_input):
     return predicted_absorbance[0], predicted_concentration[0]
 
 
+MODELS = {
+    'blue': (blue_scaler_X, blue_pls_absorbance_model, blue_pls_concentration_model,
+             blue_scaler_y_absorbance, blue_scaler_y_concentration),
+    'orange': (orange_scaler_X, orange_pls_absorbance_model, orange_pls_concentration_model,
+               orange_scaler_y_absorbance, orange_scaler_y_concentration),
+}
+
+
+def predict_concentration_absorbance_batch(X):
+    """对形状为 (n, 3) 的 RGB 矩阵批量预测，结果与逐行调用 predict_concentration_absorbance 相同
+
+    按 Red>Blue 把整表分成橙色和蓝色两组，每组只做一次标准化和两次 PLS 预测，再按原顺序放回。
+    返回 (吸光度, 浓度, 颜色类型) 三个长度为 n 的数组。
+    """
+    X = np.asarray(X, dtype=np.float64)
+    is_orange = X[:, 0] > X[:, 2]
+    color_types = np.where(is_orange, 'orange', 'blue')
+
+    predicted_absorbance = np.zeros(len(X))
+    predicted_concentration = np.zeros(len(X))
+    for color_type, mask in (('orange', is_orange), ('blue', ~is_orange)):
+        if mask.any():
+            predictions = sklearn_predict(X[mask], *MODELS[color_type])
+            predicted_absorbance[mask] = predictions[:, 0]
+            predicted_concentration[mask] = predictions[:, 1]
+
+    # 与单行版本一致，只修正浓度的负值
+    predicted_concentration = np.maximum(0, predicted_concentration)
+    return predicted_absorbance, predicted_concentration, color_types
+
+
 # 读取输入文件，执行预测，并保存结果
 def process_and_predict(input_file, output_file):
     # 读取输入文件
     data = pd.read_excel(input_file)
 
-    # 创建存储预测结果的新列
-    predicted_absorbance_list = []
-    predicted_concentration_list = []
-
-    # 遍历每一行数据，提取RGB进行预测
-    for index, row in data.iterrows():
-        rgb_input = {'red': row['Red'], 'green': row['Green'], 'blue': row['Blue']}
-        predicted_absorbance, predicted_concentration = predict_concentration_absorbance(rgb_input)
-
-        # 存储预测结果
-        predicted_absorbance_list.append(predicted_absorbance)
-        predicted_concentration_list.append(predicted_concentration)
+    # 整表一次性预测，结果按原来的行顺序写回
+    predicted_absorbance, predicted_concentration, _ = predict_concentration_absorbance_batch(
+        data[['Red', 'Green', 'Blue']].to_numpy(dtype=np.float64))
 
     # 将预测结果添加到DataFrame
-    data['PredictedConcentration'] = predicted_concentration_list
-    data['PredictedAbsorbance'] = predicted_absorbance_list
+    data['PredictedConcentration'] = predicted_concentration
+    data['PredictedAbsorbance'] = predicted_absorbance
 
     # 按照Absorbance列倒序排序
     data_sorted = data.sort_values(by='Absorbance', ascending=False)
@@ -99,7 +123,8 @@ def process_and_predict(input_file, output_file):
     print(f"预测结果已保存至: {output_file}")
 
 
-# 调用处理函数
-input_file = '../newData/light/blue-AllLightData/blue-TiO2.xlsx'  # 你的输入文件
-output_file = '../newData/light/blue-AllLightData/predicted/blue-TiO2-predicted.xlsx'  # 预测结果输出文件
-process_and_predict(input_file, output_file)
+if __name__ == '__main__':
+    # 调用处理函数
+    input_file = '../newData/light/blue-AllLightData/blue-TiO2.xlsx'  # 你的输入文件
+    output_file = '../newData/light/blue-AllLightData/predicted/blue-TiO2-predicted.xlsx'  # 预测结果输出文件
+    process_and_predict(input_file, output_file)